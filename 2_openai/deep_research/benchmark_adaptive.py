@@ -0,0 +1,171 @@
+"""
+Search cost, latency and coverage of the adaptive planner against the fixed five searches per query.
+Each simulated query has a number of distinct aspects to find, some much more widely reported than others,
+and a number of searches the planner judges it to need: one for a simple question, four for a typical one and
+eight for a broad topic. Each of the searches needed turns up its own share of the aspects, and every search
+also finds a couple of the most widely reported ones, so any further searches only repeat what was found.
+The adaptive planner is stubbed to ask for two more searches than needed at low priority, so that stopping
+on novelty is exercised too. Uses the stub models and latencies
+of benchmark_pipeline.py, and covers planning and searching only.
+
+Usage: uv run benchmark_adaptive.py [queries]   (defaults to 200)
+"""
+
+import io
+import re
+import sys
+import json
+import math
+import random
+import asyncio
+import contextlib
+import statistics
+import time
+from collections import defaultdict
+from agents import ModelResponse, Usage, set_tracing_disabled
+import research_manager
+from research_manager import ResearchManager
+from planner_agent import HOW_MANY_SEARCHES, MAX_SEARCHES
+from benchmark_pipeline import TIME_SCALE, CONCURRENCY, PLAN_SECONDS, OUTLINE_SECONDS, StubModel, message, prompt, search_latency, outline
+
+# (share of queries, aspects, searches needed)
+QUERY_KINDS = [(0.4, 3, 1), (0.4, 8, 4), (0.2, 20, 8)]
+EXTRA_SEARCHES = 2
+
+SEARCH_INPUT_TOKENS = 2_500
+SEARCH_OUTPUT_TOKENS = 300
+
+SEARCH_TERM = re.compile(r"Search term: Query (\d+) search (\d+)")
+
+# Searches started and tokens used, by query
+searches = defaultdict(int)
+tokens = defaultdict(int)
+
+
+def query_kind(query_id: int) -> tuple[int, int]:
+    rng = random.Random(query_id)
+    roll = rng.random()
+    for share, aspects, needed in QUERY_KINDS:
+        if roll < share:
+            return aspects, needed
+        roll -= share
+    return QUERY_KINDS[-1][1:]
+
+
+def aspects_found(query_id: int, index: int) -> set[int]:
+    """The search's own share of the aspects, if it is one of those needed, plus a couple of widely reported ones"""
+    aspects, needed = query_kind(query_id)
+    share = math.ceil(aspects / needed)
+    found = set(range(index * share, min((index + 1) * share, aspects))) if index < needed else set()
+    rng = random.Random(f"{query_id}:{index}")
+    weights = [1 / (rank + 1) for rank in range(aspects)]
+    return found | set(rng.choices(range(aspects), weights, k=2))
+
+
+def summary(query_id: int, index: int) -> str:
+    found = " ".join(
+        f"aspect{query_id}x{aspect} finding{query_id}x{aspect} source{query_id}x{aspect} detail{query_id}x{aspect}"
+        for aspect in sorted(aspects_found(query_id, index))
+    )
+    return f"Overview and background of the topic: {found}. Widely reported."
+
+
+class StubSearchModel(StubModel):
+    """Summarizes the aspects a search turns up, counting the searches and tokens for each query"""
+
+    def __init__(self):
+        super().__init__(None, search_latency)
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        text = prompt(input)
+        query_id, index = map(int, SEARCH_TERM.search(text).groups())
+        searches[query_id] += 1
+        await asyncio.sleep(search_latency(text) * TIME_SCALE)
+        usage = Usage(
+            requests=1,
+            input_tokens=SEARCH_INPUT_TOKENS,
+            output_tokens=SEARCH_OUTPUT_TOKENS,
+            total_tokens=SEARCH_INPUT_TOKENS + SEARCH_OUTPUT_TOKENS,
+        )
+        tokens[query_id] += usage.total_tokens
+        return ModelResponse(output=[message(summary(query_id, index))], usage=usage, response_id=None)
+
+
+def plan(text: str, adaptive: bool) -> str:
+    query = text.removeprefix("Query: ")
+    query_id = int(query.split()[-1])
+    _, needed = query_kind(query_id)
+    count = min(needed + EXTRA_SEARCHES, MAX_SEARCHES) if adaptive else HOW_MANY_SEARCHES
+    items = [{"reason": "Stub", "query": f"{query} search {i}", "priority": 10 - i if i < needed else 2} for i in range(count)]
+    if not adaptive:
+        for item in items:
+            del item["priority"]
+    return json.dumps({"searches": items})
+
+
+def stub_agents() -> None:
+    research_manager.planner_agent = research_manager.planner_agent.clone(
+        model=StubModel(lambda text: plan(text, False), lambda text: PLAN_SECONDS)
+    )
+    research_manager.adaptive_planner_agent = research_manager.adaptive_planner_agent.clone(
+        model=StubModel(lambda text: plan(text, True), lambda text: PLAN_SECONDS)
+    )
+    research_manager.search_agent = research_manager.search_agent.clone(model=StubSearchModel(), tools=[])
+    research_manager.outline_agent = research_manager.outline_agent.clone(model=StubModel(outline, lambda text: OUTLINE_SECONDS))
+
+
+async def research(manager: ResearchManager, query_id: int, limit: asyncio.Semaphore) -> tuple[float, float]:
+    """Plan and search; returns simulated seconds and the share of the query's aspects the results cover"""
+    async with limit:
+        start = time.perf_counter()
+        search_plan = await manager.plan_searches(f"Query {query_id}")
+        results, _ = await manager.gather_results(f"Query {query_id}", search_plan)
+        seconds = (time.perf_counter() - start) / TIME_SCALE
+    found = set(re.findall(rf"aspect{query_id}x(\d+)", " ".join(results)))
+    return seconds, len(found) / query_kind(query_id)[0]
+
+
+def describe(runs: list[tuple[int, float, float]]) -> str:
+    ids = [run[0] for run in runs]
+    percentiles = statistics.quantiles([run[1] for run in runs], n=100) if len(runs) > 1 else [runs[0][1]] * 99
+    return (
+        f"searches {sum(searches[i] for i in ids) / len(ids):4.1f}  tokens {sum(tokens[i] for i in ids) / len(ids):7,.0f}  "
+        f"p50 {percentiles[49]:5.1f}s  p95 {percentiles[94]:5.1f}s  coverage {statistics.mean(run[2] for run in runs):.1%}"
+    )
+
+
+async def run_mode(manager: ResearchManager, queries: int) -> list[str]:
+    """One line for all the queries, then one for each kind of query"""
+    searches.clear()
+    tokens.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        limit = asyncio.Semaphore(CONCURRENCY)
+        outcomes = await asyncio.gather(*(research(manager, query_id, limit) for query_id in range(queries)))
+    runs = [(query_id, *outcome) for query_id, outcome in enumerate(outcomes)]
+    lines = [describe(runs)]
+    for _, aspects, needed in QUERY_KINDS:
+        kind = [run for run in runs if query_kind(run[0]) == (aspects, needed)]
+        if kind:
+            lines.append(f"  {needed} needed: {describe(kind)}")
+    return lines
+
+
+async def main(queries: int) -> None:
+    set_tracing_disabled(True)
+    stub_agents()
+    timeout = research_manager.SEARCH_TIMEOUT_SECONDS * TIME_SCALE
+    grace = research_manager.STRAGGLER_GRACE_SECONDS * TIME_SCALE
+    budget = research_manager.SEARCH_BUDGET_SECONDS * TIME_SCALE
+    print(f"{queries} queries, per query, in simulated seconds")
+    for name, manager in (
+        ("fixed-5", ResearchManager(search_timeout=timeout, grace_seconds=grace, search_cache=None)),
+        ("adaptive", ResearchManager(adaptive=True, search_timeout=timeout, grace_seconds=grace, budget_seconds=budget, search_cache=None)),
+    ):
+        lines = await run_mode(manager, queries)
+        print(f"{name:>10}: {lines[0]}")
+        for line in lines[1:]:
+            print(f"{'':>10}{line}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
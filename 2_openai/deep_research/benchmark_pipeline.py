@@ -0,0 +1,172 @@
+"""
+End-to-end research latency with every search waiting on every other, against the pipelined mode with a quorum,
+per-search timeouts and an outline drafted while the searches run. The agents are replaced by stub models with
+simulated latency: searches are usually a few seconds, but one in ten is a straggler taking a minute or more.
+Runs offline, with simulated time compressed by TIME_SCALE.
+
+Usage: uv run benchmark_pipeline.py [queries]   (defaults to 200)
+"""
+
+import io
+import sys
+import json
+import contextlib
+import random
+import asyncio
+import statistics
+import time
+from agents import Model, ModelResponse, Usage, set_tracing_disabled
+from agents.models.fake_id import FAKE_RESPONSES_ID
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+import research_manager
+from research_manager import ResearchManager
+from planner_agent import HOW_MANY_SEARCHES
+
+# One simulated second takes this long in real time, and this many queries run at once
+TIME_SCALE = 0.02
+CONCURRENCY = 10
+
+SEARCH_MEDIAN_SECONDS = 6
+STRAGGLER_CHANCE = 0.1
+STRAGGLER_SECONDS = (30, 120)
+PLAN_SECONDS = 3
+OUTLINE_SECONDS = 5
+WRITER_FIRST_TOKEN_SECONDS = 4
+WRITER_SECONDS = 40
+
+
+def message(text: str) -> ResponseOutputMessage:
+    return ResponseOutputMessage(
+        id=FAKE_RESPONSES_ID,
+        content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+        role="assistant",
+        type="message",
+        status="completed",
+    )
+
+
+def prompt(input) -> str:
+    """The text of the user's message"""
+    if isinstance(input, str):
+        return input
+    return next(item["content"] for item in input if item.get("role") == "user")
+
+
+class StubModel(Model):
+    """Replies with reply(prompt) after latency(prompt) simulated seconds, streaming the reply if asked to"""
+
+    def __init__(self, reply, latency):
+        self.reply = reply
+        self.latency = latency
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        await asyncio.sleep(self.latency(prompt(input)) * TIME_SCALE)
+        return ModelResponse(output=[message(self.reply(prompt(input)))], usage=Usage(), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        text = self.reply(prompt(input))
+        chunks = [text[i : i + 500] for i in range(0, len(text), 500)]
+        await asyncio.sleep(WRITER_FIRST_TOKEN_SECONDS * TIME_SCALE)
+        for index, chunk in enumerate(chunks):
+            yield ResponseTextDeltaEvent(
+                content_index=0,
+                delta=chunk,
+                item_id=FAKE_RESPONSES_ID,
+                logprobs=[],
+                output_index=0,
+                sequence_number=index,
+                type="response.output_text.delta",
+            )
+            await asyncio.sleep((WRITER_SECONDS - WRITER_FIRST_TOKEN_SECONDS) / len(chunks) * TIME_SCALE)
+        response = Response(
+            id=FAKE_RESPONSES_ID,
+            created_at=time.time(),
+            model="stub",
+            object="response",
+            output=[message(text)],
+            parallel_tool_calls=False,
+            tool_choice="auto",
+            tools=[],
+        )
+        yield ResponseCompletedEvent(response=response, sequence_number=len(chunks), type="response.completed")
+
+
+def plan(text: str) -> str:
+    query = text.removeprefix("Query: ")
+    searches = [{"reason": "Stub", "query": f"{query} search {i}"} for i in range(HOW_MANY_SEARCHES)]
+    return json.dumps({"searches": searches})
+
+
+def search_latency(text: str) -> float:
+    rng = random.Random(text)
+    if rng.random() < STRAGGLER_CHANCE:
+        return rng.uniform(*STRAGGLER_SECONDS)
+    return SEARCH_MEDIAN_SECONDS * rng.lognormvariate(0, 0.5)
+
+
+def outline(text: str) -> str:
+    return json.dumps({"sections": [{"title": f"Section {i}", "notes": "Stub"} for i in range(5)]})
+
+
+def report(text: str) -> str:
+    return json.dumps({
+        "short_summary": "Stub summary.",
+        "markdown_report": "# Stub report\n\n" + "Lorem ipsum dolor sit amet. " * 300,
+        "follow_up_questions": ["Stub?"],
+    })
+
+
+def stub_agents() -> None:
+    research_manager.planner_agent = research_manager.planner_agent.clone(model=StubModel(plan, lambda text: PLAN_SECONDS))
+    research_manager.search_agent = research_manager.search_agent.clone(model=StubModel(lambda text: "Stub summary.", search_latency), tools=[])
+    research_manager.outline_agent = research_manager.outline_agent.clone(model=StubModel(outline, lambda text: OUTLINE_SECONDS))
+    research_manager.writer_agent = research_manager.writer_agent.clone(model=StubModel(report, lambda text: WRITER_SECONDS))
+
+
+async def research(manager: ResearchManager, query: str, limit: asyncio.Semaphore) -> tuple[float, int, bool]:
+    """Plan, search and write, without the email; returns simulated seconds, results used and whether there was an outline"""
+    async with limit:
+        start = time.perf_counter()
+        search_plan = await manager.plan_searches(query)
+        results, drafted = await manager.gather_results(query, search_plan)
+        async for _ in manager.write_report(query, results, drafted):
+            pass
+        return (time.perf_counter() - start) / TIME_SCALE, len(results), drafted is not None
+
+
+async def run_mode(manager: ResearchManager, queries: int) -> str:
+    # The manager reports progress with print, which would drown out the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        limit = asyncio.Semaphore(CONCURRENCY)
+        runs = await asyncio.gather(*(research(manager, f"Query {i}", limit) for i in range(queries)))
+    seconds = sorted(run[0] for run in runs)
+    percentiles = statistics.quantiles(seconds, n=100)
+    used = sum(run[1] for run in runs) / (queries * HOW_MANY_SEARCHES)
+    outlined = sum(run[2] for run in runs) / queries
+    return (
+        f"p50 {percentiles[49]:6.1f}s  p95 {percentiles[94]:6.1f}s  max {seconds[-1]:6.1f}s  "
+        f"results used {used:.1%}  outlined {outlined:.0%}"
+    )
+
+
+async def main(queries: int) -> None:
+    set_tracing_disabled(True)
+    stub_agents()
+    print(f"{queries} queries of {HOW_MANY_SEARCHES} searches each, in simulated seconds")
+    timeout = research_manager.SEARCH_TIMEOUT_SECONDS * TIME_SCALE
+    grace = research_manager.STRAGGLER_GRACE_SECONDS * TIME_SCALE
+    for name, manager in (
+        ("barrier", ResearchManager(pipelined=False, search_timeout=timeout, search_cache=None)),
+        ("pipelined", ResearchManager(pipelined=True, search_timeout=timeout, grace_seconds=grace, search_cache=None)),
+    ):
+        print(f"{name:>10}: {await run_mode(manager, queries)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
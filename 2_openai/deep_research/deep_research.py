@@ -1,12 +1,32 @@
 import gradio as gr
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from research_manager import ResearchManager
+from research_jobs import research_jobs, JobFull
 
 load_dotenv(override=True)
 
 
 async def run(query: str):
-    async for chunk in ResearchManager().run(query):
+    try:
+        job_id = await research_jobs.submit(query)
+    except JobFull as e:
+        yield str(e), ""
+        return
+    async for chunk in research_jobs.follow(job_id):
+        yield chunk, job_id
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start the workers on the server's event loop as soon as it's up, so jobs left unfinished by the
+    # last run resume straight away rather than when someone first opens the page
+    await research_jobs.start()
+    yield
+
+
+async def follow(job_id: str):
+    await research_jobs.start()
+    async for chunk in research_jobs.follow(job_id.strip()):
         yield chunk
 
 
@@ -14,10 +34,11 @@ with gr.Blocks(theme=gr.themes.Default(primary_hue="sky")) as ui:
     gr.Markdown("# Deep Research")
     query_textbox = gr.Textbox(label="What topic would you like to research?")
     run_button = gr.Button("Run", variant="primary")
+    job_textbox = gr.Textbox(label="Job ID (enter one to follow a research job that's already running)")
     report = gr.Markdown(label="Report")
-    
-    run_button.click(fn=run, inputs=query_textbox, outputs=report)
-    query_textbox.submit(fn=run, inputs=query_textbox, outputs=report)
 
-ui.launch(inbrowser=True)
+    run_button.click(fn=run, inputs=query_textbox, outputs=[report, job_textbox])
+    query_textbox.submit(fn=run, inputs=query_textbox, outputs=[report, job_textbox])
+    job_textbox.submit(fn=follow, inputs=job_textbox, outputs=report)
 
+ui.launch(inbrowser=True, app_kwargs={"lifespan": lifespan})
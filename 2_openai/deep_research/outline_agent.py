@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from agents import Agent
+
+INSTRUCTIONS = (
+    "You are a senior researcher planning a report for a research query. You will be given the query and "
+    "the first few search summaries; more will arrive later. Come up with an outline for the whole report: "
+    "the sections it should have, in order, with a note on what each should cover and which findings so far "
+    "belong in it. Cover the query as a whole, not only what these summaries happen to mention."
+)
+
+
+class ReportSection(BaseModel):
+    title: str = Field(description="The heading of the section.")
+
+    notes: str = Field(description="What the section should cover, and the findings so far that belong in it.")
+
+
+class ReportOutline(BaseModel):
+    sections: list[ReportSection] = Field(description="The sections of the report, in order.")
+
+
+outline_agent = Agent(
+    name="OutlineAgent",
+    instructions=INSTRUCTIONS,
+    model="gpt-4o-mini",
+    output_type=ReportOutline,
+)
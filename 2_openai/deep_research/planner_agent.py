@@ -20,4 +20,29 @@ planner_agent = Agent(
     instructions=INSTRUCTIONS,
     model="gpt-4o-mini",
     output_type=WebSearchPlan,
+)
+
+
+MAX_SEARCHES = 10
+
+ADAPTIVE_INSTRUCTIONS = f"You are a helpful research assistant. Given a query, come up with a set of web searches \
+to perform to best answer the query. Use as few searches as the query needs: one or two for a simple factual \
+question, up to {MAX_SEARCHES} for a broad or multi-part topic. Give each search a priority from 1 to 10, where 10 \
+is essential to answering the query and 1 is only nice to have; the most important searches will be run first, \
+and the least important may be skipped."
+
+
+class PrioritizedWebSearchItem(WebSearchItem):
+    priority: int = Field(description="How important this search is to answering the query, from 1 (nice to have) to 10 (essential).")
+
+
+class PrioritizedWebSearchPlan(WebSearchPlan):
+    searches: list[PrioritizedWebSearchItem] = Field(description="A list of web searches to perform to best answer the query.")
+
+
+adaptive_planner_agent = Agent(
+    name="AdaptivePlannerAgent",
+    instructions=ADAPTIVE_INSTRUCTIONS,
+    model="gpt-4o-mini",
+    output_type=PrioritizedWebSearchPlan,
 )
\ No newline at end of file
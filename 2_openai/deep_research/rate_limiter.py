@@ -0,0 +1,292 @@
+"""
+Client-side rate limiting for model calls, shared by every agent in the process.
+
+Each provider, and optionally each model, gets token buckets for requests per minute and tokens per minute.
+A call waits until both have room for it, reserving an estimate of its tokens that is corrected once the
+response reports its usage. A 429 pauses everyone using that limiter for the retry-after period, halves its
+rate, and retries the call; the rate then creeps back up with each success. The clients behind it are made
+with max_retries=0, so every 429 reaches the limiter instead of being retried unseen inside the OpenAI SDK;
+the connection errors and 5xx responses the SDK would also have retried are backed off and retried here.
+
+Limits come from RATE_LIMITS, e.g. "openai=500/200000,deepseek=60/,gpt-4.1-mini=300/150000", as requests
+and tokens per minute with either left blank for no limit. Providers not listed use DEFAULT_RATE_LIMIT.
+Wrap a Model with rate_limited(), or pass rate_limited_provider as a RunConfig's model_provider.
+
+This is a copy of 6_mcp/rate_limiter.py, kept in sync by hand since each folder runs on its own; it differs
+only in adding RateLimitedModelProvider, since these agents name their models as strings.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from agents import Model, ModelProvider, ModelResponse
+from agents.models.multi_provider import MultiProvider
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+load_dotenv(override=True)
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+DEFAULT_RATE_LIMIT = os.getenv("DEFAULT_RATE_LIMIT", "500/200000")
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "5"))
+
+# Assumed length of a reply when the model settings don't cap it, for the up-front token reservation
+DEFAULT_COMPLETION_TOKENS = 1_000
+CHARACTERS_PER_TOKEN = 4
+
+MAX_BACKOFF_SECONDS = 60
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY_STEP = 0.05
+
+
+def parse_limit(spec: str) -> tuple[float | None, float | None]:
+    requests, _, tokens = spec.partition("/")
+    return (float(requests) if requests.strip() else None, float(tokens) if tokens.strip() else None)
+
+
+def parse_limits(spec: str) -> dict[str, tuple[float | None, float | None]]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, limit = item.split("=", 1)
+            limits[name.strip()] = parse_limit(limit)
+    return limits
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 a second, up to a minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, scale: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait(self, amount: float, scale: float) -> float:
+        """Seconds until amount is available; a request bigger than the bucket only waits for a full one"""
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / (self.rate * scale) if missing > 0 else 0.0
+
+
+class RateLimiter:
+    def __init__(self, name: str, requests_per_minute: float | None, tokens_per_minute: float | None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tokens_used = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def _reserve(self, tokens: float) -> float:
+        """Take a request and tokens if they're available now, or return how long to wait for them"""
+        now = time.monotonic()
+        wait = self.blocked_until - now
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket:
+                bucket.refill(now, self.scale)
+                wait = max(wait, bucket.wait(amount, self.scale))
+        if wait <= 0:
+            if self.requests:
+                self.requests.tokens -= 1
+            if self.tokens:
+                self.tokens.tokens -= tokens
+        return wait
+
+    async def acquire(self, tokens: float) -> None:
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                wait = self._reserve(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        with self._lock:
+            self.throttled_seconds += time.monotonic() - started
+
+    def record(self, estimated: float, used: float) -> None:
+        """Settle the reservation against actual usage; going into debt holds back the next callers"""
+        with self._lock:
+            if self.tokens:
+                self.tokens.tokens -= used - estimated
+            self.calls += 1
+            self.tokens_used += used
+            self.scale = min(1.0, self.scale + RATE_RECOVERY_STEP)
+
+    def fail(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def penalize(self, delay: float) -> None:
+        with self._lock:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.scale = max(MIN_RATE_SCALE, self.scale / 2)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "tokens": self.tokens_used,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "rate_scale": self.scale,
+            }
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_configured = parse_limits(RATE_LIMITS)
+
+
+def get_limiters(provider: str, model_name: str) -> list[RateLimiter]:
+    """The provider's limiter, plus the model's own if it has a limit configured"""
+    keys = [provider] + ([model_name] if model_name in _configured and model_name != provider else [])
+    limiters = []
+    with _limiters_lock:
+        for key in keys:
+            if key not in _limiters:
+                _limiters[key] = RateLimiter(key, *_configured.get(key, parse_limit(DEFAULT_RATE_LIMIT)))
+            limiters.append(_limiters[key])
+    return limiters
+
+
+def estimate_tokens(system_instructions, input, model_settings) -> int:
+    prompt = len(system_instructions or "") + len(input if isinstance(input, str) else json.dumps(input, default=str))
+    return prompt // CHARACTERS_PER_TOKEN + (model_settings.max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+# Errors the OpenAI SDK would have retried itself; a 429 also slows down everyone sharing the limiter
+RETRIED_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with jitter"""
+    return min(MAX_BACKOFF_SECONDS, 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def retry_after(error: RateLimitError, attempt: int) -> float:
+    """The provider's retry-after if it gave one, otherwise exponential backoff with jitter"""
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return backoff(attempt)
+
+
+class RateLimitedModel(Model):
+    """Wraps a Model so each call waits for its limiters, and a 429 or transient failure is backed off and retried"""
+
+    def __init__(self, model: Model, limiters: list[RateLimiter]):
+        self.model = model
+        self.limiters = limiters
+
+    async def _acquire(self, tokens: float) -> None:
+        for limiter in self.limiters:
+            await limiter.acquire(tokens)
+
+    def _fail(self) -> None:
+        for limiter in self.limiters:
+            limiter.fail()
+
+    def _record(self, estimated: float, used: float | None) -> None:
+        for limiter in self.limiters:
+            limiter.record(estimated, used or estimated)
+
+    async def _back_off(self, error: Exception, attempt: int) -> None:
+        if isinstance(error, RateLimitError):
+            delay = retry_after(error, attempt)
+            print(f"Rate limited by {self.limiters[0].name}; retrying in {delay:.1f}s")
+            for limiter in self.limiters:
+                limiter.penalize(delay)
+        else:
+            # Not the provider pushing back, so only this call waits
+            delay = backoff(attempt)
+            print(f"{type(error).__name__} from {self.limiters[0].name}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> ModelResponse:
+        estimated = estimate_tokens(system_instructions, input, model_settings)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await self._acquire(estimated)
+            try:
+                response = await self.model.get_response(
+                    system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+                )
+            except RETRIED_ERRORS as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    self._fail()
+                    raise
+                await self._back_off(e, attempt)
+                continue
+            self._record(estimated, response.usage.total_tokens)
+            return response
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        # A stream can only be retried if it fails before its first event has been passed on
+        estimated = estimate_tokens(system_instructions, input, model_settings)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await self._acquire(estimated)
+            started = False
+            used = None
+            try:
+                async for event in self.model.stream_response(
+                    system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+                ):
+                    if event.type == "response.completed" and event.response.usage:
+                        used = event.response.usage.total_tokens
+                    started = True
+                    yield event
+            except RETRIED_ERRORS as e:
+                if started or attempt == RATE_LIMIT_RETRIES:
+                    self._fail()
+                    raise
+                await self._back_off(e, attempt)
+                continue
+            self._record(estimated, used)
+            return
+
+
+def rate_limited(model: Model, provider: str, model_name: str) -> RateLimitedModel:
+    return RateLimitedModel(model, get_limiters(provider, model_name))
+
+
+class RateLimitedModelProvider(ModelProvider):
+    """Resolves model names as the Agents SDK does by default, with every model rate limited"""
+
+    def __init__(self, provider: ModelProvider | None = None):
+        self.provider = provider
+
+    def get_model(self, model_name: str | None) -> Model:
+        if self.provider is None:
+            # Made on first use, so importing this module doesn't need an OpenAI key
+            self.provider = MultiProvider(openai_client=AsyncOpenAI(max_retries=0))
+        model = self.provider.get_model(model_name)
+        name = model_name or "default"
+        return rate_limited(model, name.split("/")[0] if "/" in name else "openai", name)
+
+
+rate_limited_provider = RateLimitedModelProvider()
+
+
+def rate_limit_stats() -> dict[str, dict]:
+    """Counters for every limiter in this process, keyed by provider or model name"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,229 @@
+"""
+A queue of research jobs, run by a fixed pool of workers rather than by each browser request.
+
+Submitted queries are saved as jobs in SQLite at RESEARCH_JOBS_PATH, and RESEARCH_WORKERS workers take them in
+order. Each job goes through the plan, search, write and email stages, and the output of each stage is saved
+as it completes, so after a restart unfinished jobs are picked up again from the stage they had reached.
+Every stage has a global concurrency limit across all jobs (STAGE_CONCURRENCY, with the limit on search
+counting individual web searches), and no more than RESEARCH_MAX_PENDING jobs may wait at once.
+Progress for a job is followed by its id with follow(), from any session. SQLite is only touched from worker
+threads, and followers of a job running in this process get its progress from memory, not the database.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from agents import trace, gen_trace_id
+from dotenv import load_dotenv
+from outline_agent import ReportOutline
+from writer_agent import ReportData
+from research_manager import ResearchManager
+
+load_dotenv(override=True)
+
+RESEARCH_JOBS_PATH = os.getenv("RESEARCH_JOBS_PATH", "research_jobs.db")
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "4"))
+RESEARCH_MAX_PENDING = int(os.getenv("RESEARCH_MAX_PENDING", "100"))
+RESEARCH_ADAPTIVE = os.getenv("RESEARCH_ADAPTIVE", "false").strip().lower() == "true"
+RESEARCH_PIPELINED = os.getenv("RESEARCH_PIPELINED", "false").strip().lower() == "true"
+
+STAGES = ["plan", "search", "write", "email"]
+STAGE_CONCURRENCY = {"plan": 4, "search": 10, "write": 2, "email": 2}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        message TEXT,
+        plan TEXT,
+        results TEXT,
+        outline TEXT,
+        report TEXT,
+        error TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    )
+"""
+
+
+class JobFull(Exception):
+    pass
+
+
+class ResearchJobs:
+    def __init__(
+        self,
+        path: str = RESEARCH_JOBS_PATH,
+        workers: int = RESEARCH_WORKERS,
+        max_pending: int = RESEARCH_MAX_PENDING,
+        adaptive: bool = RESEARCH_ADAPTIVE,
+        pipelined: bool = RESEARCH_PIPELINED,
+    ):
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._limits = {stage: asyncio.Semaphore(limit) for stage, limit in STAGE_CONCURRENCY.items()}
+        self.adaptive = adaptive
+        self.pipelined = pipelined
+        self._messages: dict[str, str] = {}
+        self._changed: dict[str, asyncio.Event] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute(SCHEMA)
+        return conn
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    async def _save(self, job_id: str, **fields) -> None:
+        await asyncio.to_thread(self._update, job_id, **fields)
+
+    def read_job(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _read_unfinished(self) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created").fetchall()
+        return [row["id"] for row in rows]
+
+    def _create(self, job_id: str, query: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, query, status, message, created, updated) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, query, "Queued", now, now),
+            )
+
+    def _wake(self, job_id: str) -> None:
+        changed = self._changed.pop(job_id, None)
+        if changed:
+            changed.set()
+
+    async def _publish(self, job_id: str, message: str, save: bool = True) -> None:
+        """Pass a progress message to anyone following the job; partial reports aren't saved, only status"""
+        self._messages[job_id] = message
+        if save:
+            await self._save(job_id, message=message)
+        self._wake(job_id)
+
+    async def _finish(self, job_id: str, **fields) -> None:
+        """Save a job's outcome and wake its followers, who read it from the database; nothing is kept in memory"""
+        await self._save(job_id, **fields)
+        self._messages.pop(job_id, None)
+        self._wake(job_id)
+
+    async def start(self) -> None:
+        """Start the workers on the running event loop, and queue any jobs left unfinished by the last process"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        unfinished = await asyncio.to_thread(self._read_unfinished)
+        for job_id in unfinished:
+            self._queue.put_nowait(job_id)
+        if unfinished:
+            print(f"Resuming {len(unfinished)} research jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def submit(self, query: str) -> str:
+        """Save a new job and queue it, returning its id; raises JobFull if too many are waiting"""
+        await self.start()
+        if self._queue.qsize() >= self.max_pending:
+            raise JobFull(f"There are already {self.max_pending} research jobs waiting; please try again later")
+        job_id = uuid.uuid4().hex[:12]
+        await asyncio.to_thread(self._create, job_id, query)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Research job {job_id} failed: {e}")
+                await self._finish(job_id, status="failed", error=str(e), message=f"Research failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        """Run a job's remaining stages, saving the output of each"""
+        job = await asyncio.to_thread(self.read_job, job_id)
+        query = job["query"]
+        done = STAGES.index(job["stage"]) + 1 if job["stage"] else 0
+        await self._save(job_id, status="running")
+        # A manager per job, since it keeps state about the run in progress
+        manager = ResearchManager(search_limit=self._limits["search"], adaptive=self.adaptive, pipelined=self.pipelined)
+        trace_id = gen_trace_id()
+        with trace("Research trace", trace_id=trace_id):
+            print(f"Research job {job_id}: https://platform.openai.com/traces/trace?trace_id={trace_id}")
+            if done <= STAGES.index("plan"):
+                await self._publish(job_id, "Planning searches...")
+                async with self._limits["plan"]:
+                    search_plan = await manager.plan_searches(query)
+                job["plan"] = search_plan.model_dump_json()
+                await self._save(job_id, stage="plan", plan=job["plan"])
+            if done <= STAGES.index("search"):
+                await self._publish(job_id, "Searches planned, starting to search...")
+                search_plan = manager.plan_type.model_validate_json(job["plan"])
+                results, outline = await manager.gather_results(query, search_plan)
+                job["results"] = json.dumps(results)
+                job["outline"] = outline.model_dump_json() if outline else None
+                await self._save(job_id, stage="search", results=job["results"], outline=job["outline"])
+            if done <= STAGES.index("write"):
+                await self._publish(job_id, "Searches complete, writing report...")
+                results = json.loads(job["results"])
+                outline = ReportOutline.model_validate_json(job["outline"]) if job["outline"] else None
+                async with self._limits["write"]:
+                    async for update in manager.write_report(query, results, outline):
+                        if isinstance(update, ReportData):
+                            job["report"] = update.model_dump_json()
+                        else:
+                            await self._publish(job_id, update, save=False)
+                await self._save(job_id, stage="write", report=job["report"])
+            report = ReportData.model_validate_json(job["report"])
+            if done <= STAGES.index("email"):
+                await self._publish(job_id, "Report written, sending email...")
+                async with self._limits["email"]:
+                    await manager.send_email(report)
+                await self._save(job_id, stage="email")
+        await self._finish(job_id, status="done", message="Research complete")
+
+    async def follow(self, job_id: str):
+        """Yield a job's progress messages as they change, ending with its report or error"""
+        if await asyncio.to_thread(self.read_job, job_id) is None:
+            yield f"No research job with id {job_id}"
+            return
+        while True:
+            changed = self._changed.setdefault(job_id, asyncio.Event())
+            message = self._messages.get(job_id)
+            if message is None:
+                # Not running in this process, so it is queued or finished; only the database knows which
+                job = await asyncio.to_thread(self.read_job, job_id)
+                if job["status"] in ("done", "failed"):
+                    self._changed.pop(job_id, None)
+                    if job["status"] == "done":
+                        yield ReportData.model_validate_json(job["report"]).markdown_report
+                    else:
+                        yield f"Research failed: {job['error']}"
+                    return
+                position = f" (job {job_id})" if job["status"] == "queued" else ""
+                message = job["message"] + position
+            yield message
+            await changed.wait()
+
+
+research_jobs = ResearchJobs()
@@ -1,12 +1,121 @@
-from agents import Runner, trace, gen_trace_id
+from agents import Runner, RunConfig, Usage, trace, gen_trace_id
+from openai.types.responses import ResponseTextDeltaEvent
 from search_agent import search_agent
-from planner_agent import planner_agent, WebSearchItem, WebSearchPlan
+from planner_agent import planner_agent, adaptive_planner_agent, WebSearchItem, WebSearchPlan, PrioritizedWebSearchPlan
 from writer_agent import writer_agent, ReportData
+from outline_agent import outline_agent, ReportOutline
+from search_cache import SearchCache, search_cache as default_search_cache
 from email_agent import email_agent
+from rate_limiter import rate_limited_provider
 import asyncio
+import json
+from contextvars import ContextVar
+import math
+import re
+import time
+
+# Every agent's model calls go through the shared per-provider rate limiter
+run_config = RunConfig(model_provider=rate_limited_provider)
+
+# A search that hasn't finished in this long is dropped
+SEARCH_TIMEOUT_SECONDS = 60
+
+# In pipelined mode, which is opt-in since it trades some results for latency, writing can start once this
+# fraction of the searches are done; the rest get STRAGGLER_GRACE_SECONDS more to be merged in, and are then cancelled
+SEARCH_QUORUM = 0.6
+STRAGGLER_GRACE_SECONDS = 10
+
+# In adaptive mode, searches run in priority order, ADAPTIVE_PARALLELISM at a time, until the time or token
+# budget is spent or the summaries stop adding anything new: NOVELTY_WINDOW summaries in a row with less than
+# NOVELTY_THRESHOLD of their terms unseen in the summaries before them, once there are at least MIN_SEARCHES
+ADAPTIVE_PARALLELISM = 4
+SEARCH_BUDGET_SECONDS = 90
+SEARCH_BUDGET_TOKENS = 60_000
+MIN_SEARCHES = 2
+NOVELTY_THRESHOLD = 0.5
+NOVELTY_WINDOW = 1
+
+TERM = re.compile(r"[a-z0-9]{4,}")
+
+# The usage of the searches for the current research, when it is on a budget
+search_usage: ContextVar[Usage | None] = ContextVar("search_usage", default=None)
+
+# How often the partial report is pushed to the UI while it streams in
+STREAM_INTERVAL_SECONDS = 0.2
+
+# As much of a JSON string's contents as is complete: plain characters and whole escape sequences
+STRING_CONTENTS = re.compile(r'(?:[^"\\]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}$')
+
+
+class StreamedField:
+    """ Decodes one string field of a JSON object while the object is still streaming in """
+
+    def __init__(self, key: str):
+        self.marker = re.compile(r'"%s"\s*:\s*"' % re.escape(key))
+        self.buffer = ""
+        self.position = None
+        self.value = ""
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        """ Add the next piece of the JSON, returning the field's value so far """
+        self.buffer += delta
+        if self.position is None:
+            match = self.marker.search(self.buffer)
+            if not match:
+                return self.value
+            self.position = match.end()
+        if not self.done:
+            contents = STRING_CONTENTS.match(self.buffer, self.position)
+            end = contents.end()
+            # Hold back the first half of a surrogate pair until the second half arrives
+            surrogate = HIGH_SURROGATE.search(self.buffer, self.position, end)
+            if surrogate:
+                end = surrogate.start()
+            self.value += json.loads(f'"{self.buffer[self.position:end]}"')
+            self.position = end
+            self.done = self.buffer.startswith('"', contents.end())
+        return self.value
+
+
+def terms(text: str) -> set[str]:
+    return set(TERM.findall(text.lower()))
+
+
+def novelty(summary: str, seen: set[str]) -> float:
+    """ The fraction of a summary's terms that haven't appeared in an earlier one """
+    summary_terms = terms(summary)
+    return len(summary_terms - seen) / len(summary_terms) if summary_terms else 0.0
+
 
 class ResearchManager:
 
+    def __init__(
+        self,
+        pipelined: bool = False,
+        quorum: float = SEARCH_QUORUM,
+        grace_seconds: float = STRAGGLER_GRACE_SECONDS,
+        search_timeout: float = SEARCH_TIMEOUT_SECONDS,
+        search_cache: SearchCache | None = default_search_cache,
+        search_limit: asyncio.Semaphore | None = None,
+        adaptive: bool = False,
+        budget_seconds: float = SEARCH_BUDGET_SECONDS,
+        budget_tokens: int = SEARCH_BUDGET_TOKENS,
+        novelty_threshold: float = NOVELTY_THRESHOLD,
+    ):
+        self.pipelined = pipelined
+        self.quorum = quorum
+        self.grace_seconds = grace_seconds
+        self.search_timeout = search_timeout
+        self.search_cache = search_cache
+        self.search_limit = search_limit
+        self.adaptive = adaptive
+        self.budget_seconds = budget_seconds
+        self.budget_tokens = budget_tokens
+        self.novelty_threshold = novelty_threshold
+        self.plan_type = PrioritizedWebSearchPlan if adaptive else WebSearchPlan
+
     async def run(self, query: str):
         """ Run the deep research process, yielding the status updates and the final report"""
         trace_id = gen_trace_id()
@@ -16,9 +125,15 @@ class ResearchManager:
             print("Starting research...")
             search_plan = await self.plan_searches(query)
             yield "Searches planned, starting to search..."     
-            search_results = await self.perform_searches(search_plan)
+            search_results, outline = await self.gather_results(query, search_plan)
+            if self.search_cache:
+                print(f"Search cache: {self.search_cache.stats()}")
             yield "Searches complete, writing report..."
-            report = await self.write_report(query, search_results)
+            async for update in self.write_report(query, search_results, outline):
+                if isinstance(update, ReportData):
+                    report = update
+                else:
+                    yield update
             yield "Report written, sending email..."
             await self.send_email(report)
             yield "Email sent, research complete"
@@ -29,11 +144,12 @@ class ResearchManager:
         """ Plan the searches to perform for the query """
         print("Planning searches...")
         result = await Runner.run(
-            planner_agent,
+            adaptive_planner_agent if self.adaptive else planner_agent,
             f"Query: {query}",
+            run_config=run_config,
         )
-        print(f"Will perform {len(result.final_output.searches)} searches")
-        return result.final_output_as(WebSearchPlan)
+        print(f"Will perform {'up to ' if self.adaptive else ''}{len(result.final_output.searches)} searches")
+        return result.final_output_as(self.plan_type)
 
     async def perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
         """ Perform the searches to perform for the query """
@@ -50,35 +166,188 @@ class ResearchManager:
         print("Finished searching")
         return results
 
-    async def search(self, item: WebSearchItem) -> str | None:
-        """ Perform a search for the query """
-        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
+    async def gather_results(self, query: str, search_plan: WebSearchPlan) -> tuple[list[str], ReportOutline | None]:
+        """ Run the searches, adaptively, pipelined or not, returning their results and an outline if one was drafted """
+        if self.adaptive:
+            return await self.perform_searches_adaptive(search_plan), None
+        if self.pipelined:
+            return await self.perform_searches_pipelined(query, search_plan)
+        return await self.perform_searches(search_plan), None
+
+    async def perform_searches_pipelined(self, query: str, search_plan: WebSearchPlan) -> tuple[list[str], ReportOutline | None]:
+        """
+        Perform the searches, drafting an outline from the first results while the rest are still running.
+        Returns once a quorum of the searches are done and the stragglers have had their grace period,
+        cancelling any still going, so one slow search can't hold up the report.
+        """
+        print("Searching...")
+        loop = asyncio.get_running_loop()
+        pending = {asyncio.create_task(self.search(item)) for item in search_plan.searches}
+        total = len(pending)
+        quorum = min(total, max(1, math.ceil(self.quorum * total)))
+        results = []
+        outline_task = None
+        deadline = None
+        while pending:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            results += [result for result in (task.result() for task in done) if result is not None]
+            print(f"Searching... {total - len(pending)}/{total} completed")
+            if outline_task is None and results:
+                outline_task = asyncio.create_task(self.draft_outline(query, list(results)))
+            if deadline is None and total - len(pending) >= quorum:
+                deadline = loop.time() + self.grace_seconds
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Cancelled {len(pending)} slow searches")
+        print("Finished searching")
+
+        # The outline is only a head start, so the report never waits on it
+        outline = None
+        if outline_task is not None:
+            if outline_task.done():
+                outline = outline_task.result()
+            else:
+                outline_task.cancel()
+        return results, outline
+
+    async def perform_searches_adaptive(self, search_plan: PrioritizedWebSearchPlan) -> list[str]:
+        """
+        Perform the most important searches first, a few at a time, and stop starting new ones once the
+        time or token budget is spent or the latest summaries are mostly repeating the earlier ones
+        """
+        print("Searching...")
+        queue = sorted(search_plan.searches, key=lambda item: item.priority, reverse=True)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget_seconds
+        usage = Usage()
+        token = search_usage.set(usage)
+        results = []
+        seen = set()
+        repetitive = 0
+        running = set()
+        stop = None
+        grace = False
+        try:
+            while queue or running:
+                while queue and stop is None and len(running) < ADAPTIVE_PARALLELISM:
+                    running.add(asyncio.create_task(self.search(queue.pop(0))))
+                if not running:
+                    break
+                # Once nothing more will start, stragglers get the same grace period as in pipelined mode
+                if not grace and (stop or not queue) and len(results) >= MIN_SEARCHES:
+                    deadline = min(deadline, loop.time() + self.grace_seconds)
+                    grace = True
+                timeout = max(deadline - loop.time(), 0)
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    stop = stop or "time budget was spent"
+                    break
+                for result in (task.result() for task in done):
+                    if result is not None:
+                        repetitive = repetitive + 1 if novelty(result, seen) < self.novelty_threshold else 0
+                        seen |= terms(result)
+                        results.append(result)
+                if stop is None and usage.total_tokens >= self.budget_tokens:
+                    stop = "token budget was spent"
+                elif stop is None and len(results) >= MIN_SEARCHES and repetitive >= NOVELTY_WINDOW:
+                    stop = "results stopped adding anything new"
+        finally:
+            search_usage.reset(token)
+            for task in running:
+                task.cancel()
+        skipped = f", skipped {len(queue) + len(running)} because the {stop}" if stop else ""
+        print(f"Finished searching: {len(results)} results using {usage.total_tokens} tokens{skipped}")
+        return results
+
+    async def draft_outline(self, query: str, search_results: list[str]) -> ReportOutline | None:
+        """ Draft an outline for the report from the first search results """
+        print("Drafting outline...")
+        input = f"Original query: {query}\nFirst search results: {search_results}"
         try:
             result = await Runner.run(
-                search_agent,
+                outline_agent,
                 input,
+                run_config=run_config,
             )
+            return result.final_output_as(ReportOutline)
+        except Exception:
+            return None
+
+    async def search(self, item: WebSearchItem) -> str | None:
+        """ Perform a search for the query, or reuse the summary of the same or a similar recent search """
+        if self.search_cache is None:
+            return await self.web_search(item)
+        return await self.search_cache.get_or_search(item.query, lambda: self.web_search(item))
+
+    async def web_search(self, item: WebSearchItem) -> str | None:
+        """ Search the web for the query, giving up after the search timeout """
+        if self.search_limit is not None:
+            async with self.search_limit:
+                return await self._web_search(item)
+        return await self._web_search(item)
+
+    async def _web_search(self, item: WebSearchItem) -> str | None:
+        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
+        try:
+            result = await asyncio.wait_for(
+                Runner.run(
+                    search_agent,
+                    input,
+                    run_config=run_config,
+                ),
+                timeout=self.search_timeout,
+            )
+            usage = search_usage.get()
+            if usage is not None:
+                usage.add(result.context_wrapper.usage)
             return str(result.final_output)
         except Exception:
             return None
 
-    async def write_report(self, query: str, search_results: list[str]) -> ReportData:
-        """ Write the report for the query """
+    async def write_report(self, query: str, search_results: list[str], outline: ReportOutline | None = None):
+        """ Write the report for the query, yielding the markdown as it streams in and then the finished ReportData """
         print("Thinking about report...")
         input = f"Original query: {query}\nSummarized search results: {search_results}"
-        result = await Runner.run(
+        if outline:
+            sections = "\n".join(f"- {section.title}: {section.notes}" for section in outline.sections)
+            input += f"\nDraft outline, made from the first results; refine it to fit all of them:\n{sections}"
+        started = time.monotonic()
+        result = Runner.run_streamed(
             writer_agent,
             input,
+            run_config=run_config,
         )
+        markdown = StreamedField("markdown_report")
+        first_token = None
+        last_yield = 0.0
+        async for event in result.stream_events():
+            if event.type != "raw_response_event" or not isinstance(event.data, ResponseTextDeltaEvent):
+                continue
+            if first_token is None:
+                first_token = time.monotonic() - started
+                print(f"First report token after {first_token:.2f}s")
+            partial = markdown.feed(event.data.delta)
+            if partial and time.monotonic() - last_yield >= STREAM_INTERVAL_SECONDS:
+                last_yield = time.monotonic()
+                yield partial
 
-        print("Finished writing report")
-        return result.final_output_as(ReportData)
+        # The summary and follow-up questions are only complete once the whole output has been validated
+        report = result.final_output_as(ReportData)
+        self.report_timings = {"first_token_seconds": first_token, "total_seconds": time.monotonic() - started}
+        print(f"Finished writing report in {self.report_timings['total_seconds']:.2f}s")
+        yield report.markdown_report
+        yield report
     
     async def send_email(self, report: ReportData) -> None:
         print("Writing email...")
         result = await Runner.run(
             email_agent,
             report.markdown_report,
+            run_config=run_config,
         )
         print("Email sent")
         return report
\ No newline at end of file
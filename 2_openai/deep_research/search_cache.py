@@ -0,0 +1,213 @@
+"""
+A persistent cache of search summaries, so repeated and overlapping research skips the web search entirely.
+
+A search is looked up first by its normalized query string, then by meaning: each query is embedded, and a
+cached summary whose query is at least SEARCH_CACHE_SIMILARITY similar (cosine) is reused. The embeddings are
+held in memory as one matrix, so the lookup is a single matrix-vector product. Summaries older than
+SEARCH_CACHE_TTL_HOURS are stale and searched again. Entries are stored in SQLite at SEARCH_CACHE_PATH, and
+loaded when the cache is first used, so they survive restarts and are shared by every session of the app.
+
+Concurrent lookups of the same normalized query are coalesced: the first runs the embedding and the search,
+and the rest wait for its summary. SQLite reads and writes run in worker threads, off the event loop.
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+load_dotenv(override=True)
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.db")
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+SEARCH_CACHE_SIMILARITY = float(os.getenv("SEARCH_CACHE_SIMILARITY", "0.92"))
+EMBEDDING_MODEL = os.getenv("SEARCH_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS searches (
+        key TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        embedding BLOB,
+        created REAL NOT NULL
+    )
+"""
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(query: str) -> str:
+    """Lowercase, without punctuation and with single spaces, so trivially different queries share a key"""
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", query.lower())).strip()
+
+
+class SearchCache:
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl_hours: float = SEARCH_CACHE_TTL_HOURS, similarity: float = SEARCH_CACHE_SIMILARITY):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.similarity = similarity
+        self.client = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._summaries: dict[str, tuple[str, float]] = {}
+        self._keys: list[str] = []
+        self._indexed: set[str] = set()
+        self._vectors: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+        self._inflight: dict[str, Future] = {}
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(SCHEMA)
+        return conn
+
+    def _load(self) -> None:
+        """Read the entries that are still fresh, and delete the rest, unless another thread got there first"""
+        with self._lock:
+            if self._loaded:
+                return
+            cutoff = time.time() - self.ttl_seconds
+            with self._connect() as conn:
+                conn.execute("DELETE FROM searches WHERE created < ?", (cutoff,))
+                rows = conn.execute("SELECT key, summary, embedding, created FROM searches ORDER BY created").fetchall()
+            for key, summary, embedding, created in rows:
+                self._add(key, summary, np.frombuffer(embedding, dtype=np.float32) if embedding else None, created)
+            self._loaded = True
+
+    def _add(self, key: str, summary: str, embedding: np.ndarray | None, created: float) -> None:
+        if key not in self._indexed and embedding is not None:
+            self._indexed.add(key)
+            self._keys.append(key)
+            self._vectors.append(embedding)
+            self._matrix = None
+        self._summaries[key] = (summary, created)
+
+    def _fresh(self, key: str) -> str | None:
+        entry = self._summaries.get(key)
+        if entry and time.time() - entry[1] <= self.ttl_seconds:
+            return entry[0]
+        return None
+
+    def _nearest(self, embedding: np.ndarray) -> str | None:
+        """The fresh summary whose query is most similar to this one, if it is similar enough"""
+        if not self._keys:
+            return None
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        scores = self._matrix @ embedding
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.similarity:
+                return None
+            summary = self._fresh(self._keys[index])
+            if summary is not None:
+                return summary
+        return None
+
+    async def _embed(self, query: str) -> np.ndarray | None:
+        try:
+            if self.client is None:
+                self.client = AsyncOpenAI()
+            response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=query)
+        except Exception as e:
+            print(f"Could not embed search query, so only exact matches are cached: {e}")
+            return None
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def _store(self, key: str, query: str, summary: str, embedding: np.ndarray | None) -> None:
+        created = time.time()
+        with self._lock:
+            self._add(key, summary, embedding, created)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, query, summary, embedding, created) VALUES (?, ?, ?, ?, ?)",
+                (key, query, summary, embedding.tobytes() if embedding is not None else None, created),
+            )
+
+    async def _search(self, key: str, query: str, search) -> str | None:
+        """Look for a similar query's summary, or else search and store the new summary"""
+        embedding = await self._embed(query)
+        if embedding is not None:
+            with self._lock:
+                summary = self._nearest(embedding)
+            if summary is not None:
+                self.similar_hits += 1
+                return summary
+        self.misses += 1
+        summary = await search()
+        if summary is not None:
+            await asyncio.to_thread(self._store, key, query, summary, embedding)
+        return summary
+
+    async def get_or_search(self, query: str, search) -> str | None:
+        """
+        Return the cached summary for this query or one like it, or else await search() for a new summary
+        and cache it if there is one. If the same query is already being looked up, wait for that instead.
+        """
+        key = normalize(query)
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+        while True:
+            with self._lock:
+                summary = self._fresh(key)
+                if summary is None:
+                    if key in self._summaries:
+                        self.stale += 1
+                    inflight = self._inflight.get(key)
+                    if inflight is None:
+                        leading = self._inflight[key] = Future()
+            if summary is not None:
+                self.exact_hits += 1
+                return summary
+            if inflight is None:
+                break
+            try:
+                summary = await asyncio.wrap_future(inflight)
+            except asyncio.CancelledError:
+                if inflight.cancelled():
+                    # The session leading the lookup was cancelled, so look again, and perhaps lead it
+                    continue
+                raise
+            self.coalesced += 1
+            return summary
+        try:
+            summary = await self._search(key, query, search)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                leading.cancel()
+            else:
+                leading.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+        leading.set_result(summary)
+        return summary
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.similar_hits + self.coalesced + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": (self.exact_hits + self.similar_hits + self.coalesced) / lookups if lookups else None,
+            "entries": len(self._summaries),
+        }
+
+
+search_cache = SearchCache()
@@ -1,15 +1,29 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+from market import get_share_price, get_share_prices, now
+from database import (
+    write_account,
+    VersionConflict,
+    read_account,
+    read_account_version,
+    write_log,
+    read_transactions,
+    read_portfolio_values,
+    clear_account_history,
+)
 
 load_dotenv(override=True)
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
 
+# How many times AccountCache.run reloads an account and retries after another process saved it first
+SAVE_ATTEMPTS = 3
+
 
 class Transaction(BaseModel):
     symbol: str
@@ -30,36 +44,157 @@ class Account(BaseModel):
     balance: float
     strategy: str
     holdings: dict[str, int]
-    transactions: list[Transaction]
-    portfolio_value_time_series: list[tuple[str, float]]
+
+    # Running aggregates, updated in O(1) per trade: total spent on buys less proceeds from sells,
+    # profit locked in by sales, and the average cost per share of each current holding
+    net_invested: float = 0.0
+    realized_profit_loss: float = 0.0
+    cost_basis: dict[str, float] = Field(default_factory=dict)
+
+    # History lives in append-only tables; it is read lazily, and only new entries are written on save
+    _transactions: list[Transaction] | None = PrivateAttr(default=None)
+    _portfolio_value_time_series: list[tuple[str, float]] | None = PrivateAttr(default=None)
+    _new_transactions: list[Transaction] = PrivateAttr(default_factory=list)
+    _new_portfolio_values: list[tuple[str, float]] = PrivateAttr(default_factory=list)
+
+    # Fields changed since the last save, and the version of the row this object was loaded from or saved as
+    _dirty: set[str] = PrivateAttr(default_factory=set)
+    _version: int = PrivateAttr(default=0)
 
     @classmethod
     def get(cls, name: str):
         fields = read_account(name.lower())
         if not fields:
-            fields = {
-                "name": name.lower(),
-                "balance": INITIAL_BALANCE,
-                "strategy": "",
-                "holdings": {},
-                "transactions": [],
-                "portfolio_value_time_series": []
-            }
-            write_account(name, fields)
-        return cls(**fields)
-    
-    
+            account = cls(name=name.lower(), balance=INITIAL_BALANCE, strategy="", holdings={})
+            try:
+                account.save()
+            except VersionConflict:
+                # Another process created it first
+                return cls.get(name)
+            return account
+        version = fields.pop("version")
+        missing_aggregates = fields["net_invested"] is None
+        account = cls(**{key: value for key, value in fields.items() if value is not None})
+        account._version = version
+        if missing_aggregates:
+            account.rebuild_aggregates()
+            account.save()
+        return account
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._dirty.add(name)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def transactions(self) -> list[Transaction]:
+        if self._transactions is None:
+            stored = [Transaction(**row) for row in read_transactions(self.name)]
+            self._transactions = stored + self._new_transactions
+        return self._transactions
+
+    @property
+    def portfolio_value_time_series(self) -> list[tuple[str, float]]:
+        if self._portfolio_value_time_series is None:
+            stored = [tuple(point) for point in read_portfolio_values(self.name)]
+            self._portfolio_value_time_series = stored + self._new_portfolio_values
+        return self._portfolio_value_time_series
+
+    def add_transaction(self, transaction: Transaction):
+        self._new_transactions.append(transaction)
+        if self._transactions is not None:
+            self._transactions.append(transaction)
+
+    def add_portfolio_value(self, when: str, value: float):
+        self._new_portfolio_values.append((when, value))
+        if self._portfolio_value_time_series is not None:
+            self._portfolio_value_time_series.append((when, value))
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        """
+        Write the fields changed since the last save and any new history; a no-op if nothing has changed.
+        Raises VersionConflict, writing nothing, if the account was saved elsewhere since it was loaded.
+        """
+        is_new = self._version == 0
+        if not (is_new or self._dirty or self._new_transactions or self._new_portfolio_values):
+            return
+        self._version = write_account(
+            self.name.lower(),
+            self.model_dump() if is_new else self.model_dump(include=self._dirty),
+            [transaction.model_dump() for transaction in self._new_transactions],
+            self._new_portfolio_values,
+            version=self._version,
+        )
+        self._dirty = set()
+        self._new_transactions = []
+        self._new_portfolio_values = []
 
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
         self.strategy = strategy
         self.holdings = {}
-        self.transactions = []
-        self.portfolio_value_time_series = []
+        self.net_invested = 0.0
+        self.realized_profit_loss = 0.0
+        self.cost_basis = {}
+        self._transactions = []
+        self._portfolio_value_time_series = []
+        self._new_transactions = []
+        self._new_portfolio_values = []
+        clear_account_history(self.name)
         self.save()
 
+    def _update_positions(self, transaction: Transaction):
+        """ Apply a transaction to the holdings and running aggregates. """
+        symbol, quantity, price = transaction.symbol, transaction.quantity, transaction.price
+        held = self.holdings.get(symbol, 0)
+        if quantity > 0:
+            average_cost = self.cost_basis.get(symbol, 0.0)
+            self.cost_basis[symbol] = (held * average_cost + quantity * price) / (held + quantity)
+        else:
+            self.realized_profit_loss += -quantity * (price - self.cost_basis.get(symbol, price))
+        self._dirty.update({"holdings", "cost_basis"})
+        held += quantity
+        if held:
+            self.holdings[symbol] = held
+        else:
+            # If shares are completely sold, remove from holdings
+            self.holdings.pop(symbol, None)
+            self.cost_basis.pop(symbol, None)
+        self.net_invested += transaction.total()
+
+    def _replay_ledger(self) -> "Account":
+        ledger = Account(name=self.name, balance=0.0, strategy="", holdings={})
+        for transaction in self.transactions:
+            ledger._update_positions(transaction)
+        return ledger
+
+    def rebuild_aggregates(self):
+        """ Recompute the running aggregates from the full transaction ledger. """
+        ledger = self._replay_ledger()
+        self.net_invested = ledger.net_invested
+        self.realized_profit_loss = ledger.realized_profit_loss
+        self.cost_basis = ledger.cost_basis
+
+    def check_consistency(self, tolerance: float = 1e-6) -> list[str]:
+        """ Recompute holdings and aggregates from the ledger, and describe any that disagree with the running values. """
+        ledger = self._replay_ledger()
+        problems = []
+        if ledger.holdings != self.holdings:
+            problems.append(f"holdings: running {self.holdings}, ledger {ledger.holdings}")
+        for field in ["net_invested", "realized_profit_loss"]:
+            running, expected = getattr(self, field), getattr(ledger, field)
+            if abs(running - expected) > tolerance:
+                problems.append(f"{field}: running {running}, ledger {expected}")
+        for symbol in set(self.cost_basis) | set(ledger.cost_basis):
+            running, expected = self.cost_basis.get(symbol), ledger.cost_basis.get(symbol)
+            if running is None or expected is None or abs(running - expected) > tolerance:
+                problems.append(f"cost_basis[{symbol}]: running {running}, ledger {expected}")
+        return problems
+
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
         if amount <= 0:
@@ -87,18 +222,20 @@ class Account(BaseModel):
         elif price==0:
             raise ValueError(f"Unrecognized symbol {symbol}")
         
-        # Update holdings
-        self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
+        timestamp = now().strftime("%Y-%m-%d %H:%M:%S")
+        # Record transaction, updating holdings and cost basis
         transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
+        self._update_positions(transaction)
+        self.add_transaction(transaction)
         
         # Update balance
         self.balance -= total_cost
-        self.save()
         write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        try:
+            return "Completed. Latest details:\n" + self.report()
+        finally:
+            # report() saves the trade along with the new portfolio value; this only writes if it failed first
+            self.save()
 
     def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Sell shares of a stock if the user has enough shares. """
@@ -109,42 +246,60 @@ class Account(BaseModel):
         sell_price = price * (1 - SPREAD)
         total_proceeds = sell_price * quantity
         
-        # Update holdings
-        self.holdings[symbol] -= quantity
-        
-        # If shares are completely sold, remove from holdings
-        if self.holdings[symbol] == 0:
-            del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
+        timestamp = now().strftime("%Y-%m-%d %H:%M:%S")
+        # Record transaction, updating holdings and realized profit
         transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
-        self.transactions.append(transaction)
+        self._update_positions(transaction)
+        self.add_transaction(transaction)
 
         # Update balance
         self.balance += total_proceeds
-        self.save()
         write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        try:
+            return "Completed. Latest details:\n" + self.report()
+        finally:
+            # report() saves the trade along with the new portfolio value; this only writes if it failed first
+            self.save()
+
+    def current_prices(self) -> dict[str, float]:
+        """ Look up the current share price of each holding in a single batch. """
+        return get_share_prices(list(self.holdings))
 
-    def calculate_portfolio_value(self):
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
         """ Calculate the total value of the user's portfolio. """
+        if prices is None:
+            prices = self.current_prices()
         total_value = self.balance
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices[symbol] * quantity
         return total_value
 
     def calculate_profit_loss(self, portfolio_value: float):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        return portfolio_value - self.net_invested - self.balance
+
+    def calculate_unrealized_profit_loss(self, prices: dict[str, float]) -> float:
+        """ Calculate the profit or loss on current holdings against their average cost. """
+        return sum(
+            quantity * (prices[symbol] - self.cost_basis.get(symbol, prices[symbol]))
+            for symbol, quantity in self.holdings.items()
+        )
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
         return self.holdings
 
-    def get_profit_loss(self):
-        """ Report the user's profit or loss at any point in time. """
-        return self.calculate_profit_loss()
+    def get_profit_loss(self) -> dict:
+        """ Report the user's profit or loss at any point in time, split into realized and unrealized. """
+        prices = self.current_prices()
+        portfolio_value = self.calculate_portfolio_value(prices)
+        return {
+            "net_invested": self.net_invested,
+            "cost_basis": self.cost_basis,
+            "realized_profit_loss": self.realized_profit_loss,
+            "unrealized_profit_loss": self.calculate_unrealized_profit_loss(prices),
+            "total_profit_loss": self.calculate_profit_loss(portfolio_value),
+        }
 
     def list_transactions(self):
         """ List all transactions made by the user. """
@@ -152,13 +307,17 @@ class Account(BaseModel):
     
     def report(self) -> str:
         """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
+        prices = self.current_prices()
+        portfolio_value = self.calculate_portfolio_value(prices)
+        self.add_portfolio_value(now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value)
         self.save()
         pnl = self.calculate_profit_loss(portfolio_value)
         data = self.model_dump()
+        data["transactions"] = self.list_transactions()
+        data["portfolio_value_time_series"] = self.portfolio_value_time_series
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
+        data["unrealized_profit_loss"] = self.calculate_unrealized_profit_loss(prices)
         write_log(self.name, "account", f"Retrieved account details")
         return json.dumps(data)
     
@@ -174,6 +333,57 @@ class Account(BaseModel):
         write_log(self.name, "account", f"Changed strategy")
         return "Changed strategy"
 
+class AccountCache:
+    """
+    Accounts kept in memory between operations, so reads don't re-query and re-validate them from SQLite.
+
+    Each use compares the cached copy with the version column, a single indexed lookup, and reloads it if
+    another process has saved a change since. Operations on the same account are serialized across threads.
+    A save still fails if another process writes between that check and the save; run() retries on a fresh copy.
+    """
+
+    def __init__(self):
+        self._accounts: dict[str, Account] = {}
+        self._locks: dict[str, threading.RLock] = defaultdict(threading.RLock)
+        self._lock = threading.Lock()
+
+    def _current(self, name: str) -> Account:
+        account = self._accounts.get(name)
+        if account is None or read_account_version(name) != account.version:
+            account = Account.get(name)
+            self._accounts[name] = account
+        return account
+
+    @contextmanager
+    def use(self, name: str):
+        """ Hold an up-to-date account for one operation; it is dropped from the cache if the operation fails. """
+        name = name.lower()
+        with self._lock:
+            lock = self._locks[name]
+        with lock:
+            account = self._current(name)
+            try:
+                yield account
+            except Exception:
+                self._accounts.pop(name, None)
+                raise
+
+    def run(self, name: str, operation, attempts: int = SAVE_ATTEMPTS):
+        """ Run an operation on an up-to-date account, reloading and rerunning it if another process saved first. """
+        for attempt in range(attempts):
+            try:
+                with self.use(name) as account:
+                    return operation(account)
+            except VersionConflict:
+                if attempt == attempts - 1:
+                    raise
+
+    def get(self, name: str) -> Account:
+        """ Return an up-to-date account for reading. """
+        with self.use(name) as account:
+            return account
+
+
 # Example of usage:
 if __name__ == "__main__":
     account = Account("John Doe")
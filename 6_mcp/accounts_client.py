@@ -1,39 +1,129 @@
+import asyncio
+import anyio
 import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 from agents import FunctionTool
 import json
 
 params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
 
 
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, ConnectionError))
+
+
+class AccountsClient:
+    """
+    A single long-lived session with accounts_server.py, shared by every caller in the process.
+
+    Concurrent calls are multiplexed over the one session, the tool list is fetched once,
+    and the server is relaunched if it dies. Read-only requests are retried after a reconnect;
+    tool calls are not, since a buy or sell may already have been carried out.
+    """
+
+    def __init__(self, server_params: StdioServerParameters = params):
+        self.server_params = server_params
+        self._session: mcp.ClientSession | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: asyncio.Lock | None = None
+        self._tools = None
+
+    async def _run(self, ready: asyncio.Future, stopping: asyncio.Event) -> None:
+        # The stdio transport must be entered and exited by the same task, so this task owns it
+        try:
+            async with stdio_client(self.server_params) as streams:
+                async with mcp.ClientSession(*streams) as session:
+                    await session.initialize()
+                    self._session = session
+                    ready.set_result(session)
+                    await stopping.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Accounts server session ended: {e}")
+        finally:
+            self._session = None
+
+    async def session(self) -> mcp.ClientSession:
+        """Return the open session, launching the server on first use or after it has died"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new event loop, e.g. a fresh asyncio.run(); anything from the old one is gone
+            self._loop, self._lock, self._session, self._task = loop, asyncio.Lock(), None, None
+        async with self._lock:
+            if self._session is None or self._task is None or self._task.done():
+                ready = loop.create_future()
+                self._stopping = asyncio.Event()
+                self._task = asyncio.create_task(self._run(ready, self._stopping), name="accounts-client")
+                await ready
+            return self._session
+
+    async def _reset(self) -> None:
+        if self._stopping:
+            self._stopping.set()
+        if self._task:
+            try:
+                await self._task
+            except Exception:
+                pass
+        self._session = None
+
+    async def _read(self, request):
+        session = await self.session()
+        try:
+            return await request(session)
+        except Exception as e:
+            if not is_connection_error(e):
+                raise
+            await self._reset()
+            return await request(await self.session())
+
+    async def list_tools(self):
+        if self._tools is None:
+            result = await self._read(lambda session: session.list_tools())
+            self._tools = result.tools
+        return self._tools
+
+    async def call_tool(self, tool_name, tool_args):
+        session = await self.session()
+        try:
+            return await session.call_tool(tool_name, tool_args)
+        except Exception as e:
+            if is_connection_error(e):
+                await self._reset()
+            raise
+
+    async def read_resource(self, uri: str) -> str:
+        result = await self._read(lambda session: session.read_resource(uri))
+        return result.contents[0].text
+
+    async def close(self) -> None:
+        await self._reset()
+        self._task = None
+
+
+accounts_client = AccountsClient()
+
+
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    return await accounts_client.list_tools()
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    return await accounts_client.call_tool(tool_name, tool_args)
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    return await accounts_client.read_resource(f"accounts://accounts_server/{name}")
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    return await accounts_client.read_resource(f"accounts://strategy/{name}")
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +134,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
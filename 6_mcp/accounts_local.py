@@ -0,0 +1,67 @@
+import asyncio
+import json
+import threading
+from agents import FunctionTool
+from mcp.types import TextContent
+from accounts_server import mcp as accounts_mcp, on_account
+
+# In-process versions of the accounts_server.py tools, for traders running on the same host as accounts.db.
+# The schemas, descriptions and handlers come from the FastMCP server itself, and results and errors are
+# rendered exactly as the Agents SDK renders them from an MCP server, so the model sees no difference.
+
+
+def _to_tool_output(content) -> str:
+    if isinstance(content, tuple):
+        # Tools with an output schema return (unstructured, structured); MCP clients are given the former
+        content = content[0]
+    if len(content) == 1:
+        return content[0].model_dump_json()
+    elif len(content) > 1:
+        return json.dumps([item.model_dump(mode="json") for item in content])
+    return "[]"
+
+
+_worker = threading.local()
+
+
+def _call_tool_in_worker(tool_name: str, tool_args: dict):
+    """Run the server's tool on this worker thread's own event loop, created on first use and then reused"""
+    loop = getattr(_worker, "loop", None)
+    if loop is None:
+        loop = _worker.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(accounts_mcp.call_tool(tool_name, tool_args))
+
+
+async def call_accounts_tool_local(tool_name: str, tool_args: dict) -> str:
+    """Call an accounts tool in-process, off the event loop since it reads prices and SQLite synchronously"""
+    try:
+        content = await asyncio.to_thread(_call_tool_in_worker, tool_name, tool_args)
+    except Exception as e:
+        content = [TextContent(type="text", text=str(e))]
+    return _to_tool_output(content)
+
+
+async def get_accounts_tools_local() -> list[FunctionTool]:
+    local_tools = []
+    for tool in await accounts_mcp.list_tools():
+        schema = {**tool.inputSchema}
+        schema.setdefault("properties", {})
+        local_tool = FunctionTool(
+            name=tool.name,
+            description=tool.description or "",
+            params_json_schema=schema,
+            on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool_local(
+                toolname, json.loads(args) if args else {}
+            ),
+            strict_json_schema=False,
+        )
+        local_tools.append(local_tool)
+    return local_tools
+
+
+async def read_accounts_resource_local(name: str) -> str:
+    return await on_account(name, lambda account: account.report())
+
+
+async def read_strategy_resource_local(name: str) -> str:
+    return await on_account(name, lambda account: account.get_strategy())
@@ -1,8 +1,23 @@
+import asyncio
+import json
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from accounts import AccountCache
+from analytics import get_analytics
 
 mcp = FastMCP("accounts_server")
 
+# Accounts stay in memory between tool calls; each call checks the version column so changes made
+# by other processes (the Gradio app, reset.py, a second server) are never served stale
+accounts = AccountCache()
+
+async def on_account(name: str, operation):
+    """
+    Run an operation on an account in a worker thread, since it reads and writes SQLite and may fetch prices;
+    one server is shared by every trader, so its event loop must stay free to serve the others meanwhile.
+    If another process saves the account mid-operation, it is rerun on a fresh copy rather than overwriting it
+    """
+    return await asyncio.to_thread(accounts.run, name, operation)
+
 @mcp.tool()
 async def get_balance(name: str) -> float:
     """Get the cash balance of the given account name.
@@ -10,7 +25,7 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    return await on_account(name, lambda account: account.balance)
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +34,17 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    return await on_account(name, lambda account: dict(account.holdings))
+
+@mcp.tool()
+async def get_profit_loss(name: str) -> dict:
+    """Get the profit or loss of the given account name: net amount invested, average cost basis per holding,
+    realized profit or loss from sales, unrealized profit or loss on current holdings, and the total.
+
+    Args:
+        name: The name of the account holder
+    """
+    return await on_account(name, lambda account: account.get_profit_loss())
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +56,7 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    return await on_account(name, lambda account: account.buy_shares(symbol, quantity, rationale))
 
 
 @mcp.tool()
@@ -44,7 +69,7 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    return await on_account(name, lambda account: account.sell_shares(symbol, quantity, rationale))
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +79,19 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    return await on_account(name, lambda account: account.change_strategy(strategy))
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    return await on_account(name, lambda account: account.report())
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    return await on_account(name, lambda account: account.get_strategy())
+
+@mcp.resource("accounts://analytics/{name}")
+async def read_analytics_resource(name: str) -> str:
+    return await on_account(name, lambda account: json.dumps(get_analytics(account)))
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -0,0 +1,190 @@
+import threading
+import numpy as np
+from datetime import datetime
+
+SECONDS_PER_DAY = 24 * 60 * 60
+DAYS_PER_YEAR = 365
+ROLLING_WINDOWS = {"return_1d": 1, "return_7d": 7, "return_30d": 30}
+
+
+def _append(buffer: np.ndarray, size: int, new: np.ndarray) -> np.ndarray:
+    """Append new after the first size entries of buffer, doubling its capacity when it is full"""
+    needed = size + len(new)
+    if needed > len(buffer):
+        grown = np.empty(max(needed, 2 * len(buffer), 64), dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:needed] = new
+    return buffer
+
+
+class PortfolioAnalytics:
+    """
+    Performance statistics for one account, kept up to date incrementally as its history grows.
+
+    The portfolio value series lives in NumPy arrays alongside running sums of the daily returns, their
+    squares and their downside squares, the running peak and the maximum drawdown, and net cash flow and
+    quantity per symbol. Each update processes only the points and trades added since the previous one,
+    so refreshing the dashboard or reading the resource costs the same however long the history gets.
+
+    Points arrive whenever report() runs, sometimes seconds apart within a cycle and sometimes days apart,
+    so returns are taken between daily closes, each day's last point, rather than between raw points.
+    The latest day stays open, and only enters the running sums once a point from a later day arrives.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._size = 0
+        self._first = None
+        self._times = np.empty(0)
+        self._values = np.empty(0)
+        self._value_sum = 0.0
+        self._first_day = None
+        self._day = None
+        self._previous_close = None
+        self._returns = 0
+        self._return_sum = 0.0
+        self._return_sq_sum = 0.0
+        self._downside_sq_sum = 0.0
+        self._peak = 0.0
+        self._max_drawdown = 0.0
+        self._trades = 0
+        self._traded_value = 0.0
+        self._symbols: dict[str, int] = {}
+        self._cash_flow = np.zeros(0)
+        self._quantity = np.zeros(0)
+
+    def _add_points(self, points: list[tuple[str, float]]) -> None:
+        moments = [datetime.fromisoformat(when) for when, _ in points]
+        times = np.array([moment.timestamp() for moment in moments])
+        days = np.array([moment.toordinal() for moment in moments])
+        values = np.array([value for _, value in points], dtype=float)
+        self._add_closes(days, values)
+
+        peaks = np.maximum.accumulate(np.concatenate([[self._peak], values]))[1:]
+        drawdowns = np.divide(peaks - values, peaks, out=np.zeros(len(values)), where=peaks > 0)
+        self._peak = peaks[-1]
+        self._max_drawdown = max(self._max_drawdown, drawdowns.max())
+
+        self._value_sum += values.sum()
+        self._times = _append(self._times, self._size, times)
+        self._values = _append(self._values, self._size, values)
+        self._size += len(values)
+
+    def _add_closes(self, days: np.ndarray, values: np.ndarray) -> None:
+        """Fold new points into daily closes, adding the returns of days that have now closed to the sums"""
+        last_of_day = np.append(days[1:] != days[:-1], True)
+        close_days, closes = days[last_of_day], values[last_of_day]
+        if self._day is None:
+            self._first_day = close_days[0]
+            closed = closes[:-1]
+        elif self._day != close_days[0]:
+            closed = np.concatenate([self._values[self._size - 1 : self._size], closes[:-1]])
+        else:
+            # The first new points are later on the day that was still open
+            closed = closes[:-1]
+        previous = closed if self._previous_close is None else np.concatenate([[self._previous_close], closed])
+        if len(closed):
+            self._previous_close = closed[-1]
+        self._day = close_days[-1]
+        if len(previous) < 2:
+            return
+        returns = np.divide(
+            previous[1:] - previous[:-1], previous[:-1], out=np.zeros(len(previous) - 1), where=previous[:-1] != 0
+        )
+        self._returns += len(returns)
+        self._return_sum += returns.sum()
+        self._return_sq_sum += np.square(returns).sum()
+        self._downside_sq_sum += np.square(np.minimum(returns, 0.0)).sum()
+
+    def _add_trades(self, transactions: list) -> None:
+        for transaction in transactions:
+            if transaction.symbol not in self._symbols:
+                self._symbols[transaction.symbol] = len(self._symbols)
+        grow = len(self._symbols) - len(self._quantity)
+        if grow:
+            self._cash_flow = np.concatenate([self._cash_flow, np.zeros(grow)])
+            self._quantity = np.concatenate([self._quantity, np.zeros(grow)])
+        index = np.array([self._symbols[transaction.symbol] for transaction in transactions])
+        quantity = np.array([transaction.quantity for transaction in transactions], dtype=float)
+        amount = quantity * np.array([transaction.price for transaction in transactions])
+        np.add.at(self._cash_flow, index, -amount)
+        np.add.at(self._quantity, index, quantity)
+        self._traded_value += np.abs(amount).sum()
+        self._trades += len(transactions)
+
+    def update(self, series: list[tuple[str, float]], transactions: list) -> None:
+        """Bring the statistics up to date with an account's history, processing only what is new"""
+        with self._lock:
+            if series and series[0][0] != self._first or len(series) < self._size or len(transactions) < self._trades:
+                # The account has been reset since the last update, so start again
+                self.clear()
+            if len(series) > self._size:
+                self._first = series[0][0]
+                self._add_points(series[self._size :])
+            if len(transactions) > self._trades:
+                self._add_trades(transactions[self._trades :])
+
+    def _rolling_return(self, days: int) -> float | None:
+        times, values = self._times[: self._size], self._values[: self._size]
+        start = np.searchsorted(times, times[-1] - days * SECONDS_PER_DAY, side="right") - 1
+        if start < 0 or values[start] == 0:
+            return None
+        return values[-1] / values[start] - 1
+
+    def metrics(self, prices: dict[str, float] | None = None) -> dict:
+        """
+        Return the current statistics. Volatility, Sharpe and Sortino come from daily returns, including the
+        day still open, annualized by how many days with points there are per calendar day; the risk-free
+        rate is taken as zero.
+        Contributions are in dollars: realized from sales plus, where prices are given, unrealized on holdings.
+        """
+        with self._lock:
+            result = {"points": self._size, "trades": self._trades}
+            if self._size:
+                result["portfolio_value"] = self._values[self._size - 1]
+                result["max_drawdown"] = self._max_drawdown
+                result["current_drawdown"] = 1 - result["portfolio_value"] / self._peak if self._peak else 0.0
+                result["turnover"] = self._traded_value / (self._value_sum / self._size) if self._value_sum else 0.0
+                for key, days in ROLLING_WINDOWS.items():
+                    result[key] = self._rolling_return(days)
+            returns, return_sum, return_sq_sum, downside_sq_sum = (
+                self._returns, self._return_sum, self._return_sq_sum, self._downside_sq_sum
+            )
+            if self._previous_close is not None:
+                close = self._values[self._size - 1]
+                today = close / self._previous_close - 1 if self._previous_close else 0.0
+                returns += 1
+                return_sum += today
+                return_sq_sum += today * today
+                downside_sq_sum += min(today, 0.0) ** 2
+            if returns > 1:
+                mean = return_sum / returns
+                variance = max(return_sq_sum / returns - mean * mean, 0.0)
+                downside = np.sqrt(downside_sq_sum / returns)
+                periods_per_year = DAYS_PER_YEAR * returns / (self._day - self._first_day)
+                scale = np.sqrt(periods_per_year)
+                result["volatility"] = np.sqrt(variance) * scale
+                result["sharpe_ratio"] = mean / np.sqrt(variance) * scale if variance > 0 else None
+                result["sortino_ratio"] = mean / downside * scale if downside > 0 else None
+            if self._symbols:
+                held = np.array([prices.get(symbol, 0.0) if prices else 0.0 for symbol in self._symbols])
+                contribution = self._cash_flow + self._quantity * held
+                result["contribution"] = dict(zip(self._symbols, contribution.tolist()))
+            return {key: float(value) if isinstance(value, np.floating) else value for key, value in result.items()}
+
+
+_analytics: dict[str, PortfolioAnalytics] = {}
+_analytics_lock = threading.Lock()
+
+
+def get_analytics(account, prices: dict[str, float] | None = None) -> dict:
+    """Update the cached analytics for an account with any new history and return its metrics"""
+    with _analytics_lock:
+        analytics = _analytics.setdefault(account.name, PortfolioAnalytics(account.name))
+    analytics.update(account.portfolio_value_time_series, account.transactions)
+    return analytics.metrics(account.current_prices() if prices is None else prices)
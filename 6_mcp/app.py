@@ -3,8 +3,15 @@ from util import css, js, Color
 import pandas as pd
 from trading_floor import names, lastnames, short_model_names
 import plotly.express as px
-from accounts import Account
-from database import read_log
+from accounts import AccountCache
+from analytics import get_analytics
+from log_feed import LogFeed
+from tracers import cycle_metrics
+
+TRADERS_PER_ROW = 4
+
+accounts = AccountCache()
+log_feed = LogFeed(names)
 
 mapper = {
     "trace": Color.WHITE,
@@ -21,10 +28,10 @@ class Trader:
         self.name = name
         self.lastname = lastname
         self.model_name = model_name
-        self.account = Account.get(name)
+        self.account = accounts.get(name)
 
     def reload(self):
-        self.account = Account.get(self.name)
+        self.account = accounts.get(self.name)
 
     def get_title(self) -> str:
         return f"<div style='text-align: center;font-size:34px;'>{self.name}<span style='color:#ccc;font-size:24px;'> ({self.model_name}) - {self.lastname}</span></div>"
@@ -80,17 +87,67 @@ class Trader:
         emoji = "⬆" if pnl >= 0 else "⬇"
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
-    def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
+    def get_analytics(self) -> str:
+        """Summarize returns and risk from the incrementally cached analytics"""
+        metrics = get_analytics(self.account)
+
+        def percent(key):
+            value = metrics.get(key)
+            return "-" if value is None else f"{value:+.1%}"
+
+        def ratio(key):
+            value = metrics.get(key)
+            return "-" if value is None else f"{value:.2f}"
+
+        items = [
+            ("1d", percent("return_1d")),
+            ("7d", percent("return_7d")),
+            ("30d", percent("return_30d")),
+            ("Max DD", percent("max_drawdown")),
+            ("Vol", percent("volatility")),
+            ("Sharpe", ratio("sharpe_ratio")),
+            ("Sortino", ratio("sortino_ratio")),
+            ("Turnover", ratio("turnover")),
+        ]
+        cells = "".join(
+            f"<span style='margin:0 6px;'><span style='color:#888;'>{label}</span> {value}</span>" for label, value in items
+        )
+        return f"<div style='text-align: center;font-size:13px;'>{cells}</div>"
+
+    def get_cycle_metrics_df(self) -> pd.DataFrame:
+        """Duration, p50/p95 model and tool latency and tokens for each of the recent cycles"""
+        columns = ["Started", "Seconds", "LLM p50", "LLM p95", "Tool p50", "Tool p95", "Tokens"]
+        cycles = cycle_metrics(self.name)
+        if not cycles:
+            return pd.DataFrame(columns=columns)
+
+        def seconds(value):
+            return None if value is None else round(value / 1000, 2)
+
+        return pd.DataFrame(
+            [
+                [
+                    cycle["started"][11:19],
+                    seconds(cycle["duration_ms"]),
+                    seconds(cycle["model_p50_ms"]),
+                    seconds(cycle["model_p95_ms"]),
+                    seconds(cycle["tool_p50_ms"]),
+                    seconds(cycle["tool_p95_ms"]),
+                    cycle["tokens"],
+                ]
+                for cycle in cycles
+            ],
+            columns=columns,
+        )
+
+    def get_logs(self) -> str:
+        logs = log_feed.entries(self.name)
         response = ""
         for log in logs:
-            timestamp, type, message = log
+            _, timestamp, type, message = log
             color = mapper.get(type, Color.WHITE).value
             response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
-        if response != previous:
-            return response
-        return gr.update()
+        return f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
 
 
 class TraderView:
@@ -98,14 +155,18 @@ class TraderView:
         self.trader = trader
         self.portfolio_value = None
         self.chart = None
+        self.analytics = None
         self.holdings_table = None
         self.transactions_table = None
+        self.cycle_metrics_table = None
 
     def make_ui(self):
         with gr.Column():
             gr.HTML(self.trader.get_title())
             with gr.Row():
                 self.portfolio_value = gr.HTML(self.trader.get_portfolio_value)
+            with gr.Row():
+                self.analytics = gr.HTML(self.trader.get_analytics)
             with gr.Row():
                 self.chart = gr.Plot(
                     self.trader.get_portfolio_value_chart, container=True, show_label=False
@@ -132,6 +193,16 @@ class TraderView:
                     max_height=300,
                     elem_classes=["dataframe-fix"],
                 )
+            with gr.Row():
+                self.cycle_metrics_table = gr.Dataframe(
+                    value=self.trader.get_cycle_metrics_df,
+                    label="Cycle Metrics (seconds)",
+                    headers=["Started", "Seconds", "LLM p50", "LLM p95", "Tool p50", "Tool p95", "Tokens"],
+                    row_count=(5, "dynamic"),
+                    col_count=7,
+                    max_height=300,
+                    elem_classes=["dataframe-fix-small"],
+                )
 
         timer = gr.Timer(value=120)
         timer.tick(
@@ -139,35 +210,32 @@ class TraderView:
             inputs=[],
             outputs=[
                 self.portfolio_value,
+                self.analytics,
                 self.chart,
                 self.holdings_table,
                 self.transactions_table,
+                self.cycle_metrics_table,
             ],
             show_progress="hidden",
             queue=False,
         )
-        log_timer = gr.Timer(value=0.5)
-        log_timer.tick(
-            fn=self.trader.get_logs,
-            inputs=[self.log],
-            outputs=[self.log],
-            show_progress="hidden",
-            queue=False,
-        )
 
     def refresh(self):
         self.trader.reload()
         return (
             self.trader.get_portfolio_value(),
+            self.trader.get_analytics(),
             self.trader.get_portfolio_value_chart(),
             self.trader.get_holdings_df(),
             self.trader.get_transactions_df(),
+            self.trader.get_cycle_metrics_df(),
         )
 
 
 # Main UI construction
 def create_ui():
     """Create the main Gradio UI for the trading simulation"""
+    log_feed.start()
 
     traders = [
         Trader(trader_name, lastname, model_name)
@@ -178,9 +246,25 @@ def create_ui():
     with gr.Blocks(
         title="Traders", css=css, js=js, theme=gr.themes.Default(primary_hue="sky"), fill_width=True
     ) as ui:
-        with gr.Row():
-            for trader_view in trader_views:
-                trader_view.make_ui()
+        for start in range(0, len(trader_views), TRADERS_PER_ROW):
+            with gr.Row():
+                for trader_view in trader_views[start : start + TRADERS_PER_ROW]:
+                    trader_view.make_ui()
+
+        async def stream_logs():
+            """Push each session the panels whose logs have changed, from the shared feed"""
+            async for changed in log_feed.changes():
+                yield tuple(
+                    view.trader.get_logs() if view.trader.name.lower() in changed else gr.update()
+                    for view in trader_views
+                )
+
+        ui.load(
+            fn=stream_logs,
+            outputs=[trader_view.log for trader_view in trader_views],
+            show_progress="hidden",
+            concurrency_limit=None,
+        )
 
     return ui
 
@@ -0,0 +1,344 @@
+"""
+Backtest: replays the traders day by day against stored closing prices, on a simulated clock.
+
+Prices come from the columnar price store, preloaded for the whole range after taking in any days still
+only in the market table, with gaps filled from optional CSV or Parquet files of date, symbol and close.
+Each symbol's last known close carries forward over days with no data. Trades, portfolio values and logs
+are written to a separate results database, so the live accounts are never touched.
+
+Traders run concurrently, up to a parallelism limit; each trader's days run in order, since every day
+starts from the portfolio the previous one left. With --offline, a deterministic stub stands in for the
+model, so a backtest needs no API keys or network and gives the same results every time.
+
+Usage: uv run backtest.py 2025-01-01 2025-06-30 [--store prices/] [--results backtest.db] [--offline]
+"""
+
+import os
+import csv
+import json
+import random
+import asyncio
+import argparse
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from agents import Agent, Model, ModelResponse, Runner, Usage, function_tool, set_tracing_disabled
+from agents.models.fake_id import FAKE_RESPONSES_ID
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+)
+import database
+import market
+from accounts import Account, INITIAL_BALANCE
+from accounts_local import get_accounts_tools_local, read_accounts_resource_local, read_strategy_resource_local
+from analytics import get_analytics
+from price_store import get_price_store
+from reset import reset_traders
+from templates import backtest_instructions, backtest_trade_message, backtest_rebalance_message
+from traders import Trader, get_model, MAX_TURNS
+from trading_floor import names, lastnames, model_names
+
+load_dotenv(override=True)
+
+BACKTEST_PARALLELISM = int(os.getenv("BACKTEST_PARALLELISM", "4"))
+RESULTS_DB = "backtest.db"
+
+# How far before the start date to look for prices to carry forward onto the first days
+LOOKBACK_DAYS = 10
+
+# The stub model trades among these symbols
+STUB_SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "SPY", "QQQ"]
+
+
+class PriceHistory:
+    """Closing prices for every symbol over a date range, held in memory, looked up as of any day"""
+
+    def __init__(self):
+        self.days: list[str] = []
+        self._days: dict[str, list[str]] = defaultdict(list)
+        self._prices: dict[str, list[float]] = defaultdict(list)
+
+    def add_day(self, day: str, prices: dict[str, float]) -> None:
+        """Days must be added in order"""
+        for symbol, price in prices.items():
+            if price:
+                self._days[symbol].append(day)
+                self._prices[symbol].append(float(price))
+
+    def price(self, symbol: str, day: str) -> float:
+        """The close on day, or the last one before it; 0.0 for a symbol with no history, as in market.py"""
+        index = bisect_right(self._days.get(symbol, []), day) - 1
+        return self._prices[symbol][index] if index >= 0 else 0.0
+
+
+def read_price_store(path: str) -> list[tuple[str, str, float]]:
+    """Read (date, symbol, close) rows from a CSV or Parquet file, or every such file in a directory"""
+    if os.path.isdir(path):
+        return [row for filename in sorted(os.listdir(path)) for row in read_price_store(os.path.join(path, filename))]
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            return [(row["date"], row["symbol"], float(row["close"])) for row in csv.DictReader(f)]
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        df = pd.read_parquet(path, columns=["date", "symbol", "close"])
+        return list(zip(df["date"].astype(str).str[:10], df["symbol"], df["close"].astype(float)))
+    return []
+
+
+def load_price_history(start: str, end: str, store: str | None = None) -> PriceHistory:
+    """Preload every close needed for the range; the price store takes precedence over the files"""
+    lookback = (date.fromisoformat(start) - timedelta(days=LOOKBACK_DAYS)).isoformat()
+    by_day: dict[str, dict[str, float]] = defaultdict(dict)
+    if store:
+        for day, symbol, price in read_price_store(store):
+            if lookback <= day <= end:
+                by_day[day][symbol] = price
+    price_store = get_price_store()
+    price_store.import_market_table()
+    for day in price_store.dates(lookback, end):
+        by_day[day].update(price_store.day(day).closes())
+    history = PriceHistory()
+    for day in sorted(by_day):
+        history.add_day(day, by_day[day])
+    history.days = [day for day in sorted(by_day) if day >= start]
+    return history
+
+
+class Simulation:
+    """The simulated clock and prices seen by one trader; installed in market.simulation for its task"""
+
+    def __init__(self, history: PriceHistory):
+        self.history = history
+        self.day = None
+        self._ticks = 0
+
+    def advance(self, day: str) -> None:
+        self.day = day
+        self._ticks = 0
+
+    def now(self) -> datetime:
+        # Each call moves a second on from the close, so the day's trades and portfolio values stay in order
+        self._ticks += 1
+        return datetime.fromisoformat(self.day).replace(hour=16) + timedelta(seconds=self._ticks)
+
+    def price(self, symbol: str) -> float:
+        return self.history.price(symbol, self.day)
+
+
+def _tool_result(output: str):
+    """Unwrap a local accounts tool result back into a value"""
+    try:
+        return json.loads(json.loads(output)["text"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class StubModel(Model):
+    """
+    A deterministic stand-in for the model, for offline backtests.
+
+    It checks the balance and holdings, then either buys a few shares of one symbol or sells half of
+    one holding, chosen by a random generator seeded with the trader's name and the simulated day.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _call(self, call_id: str, tool: str, **arguments) -> ResponseFunctionToolCall:
+        arguments = {"name": self.name, **arguments}
+        return ResponseFunctionToolCall(
+            id=FAKE_RESPONSES_ID,
+            call_id=call_id,
+            name=tool,
+            arguments=json.dumps(arguments),
+            type="function_call",
+            status="completed",
+        )
+
+    def _reply(self, text: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=FAKE_RESPONSES_ID,
+            content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+            role="assistant",
+            type="message",
+            status="completed",
+        )
+
+    def _decide(self, outputs: dict[str, str]):
+        simulated = market.simulation.get()
+        rng = random.Random(f"{self.name}:{simulated.day}")
+        balance = _tool_result(outputs["get_balance"]) or 0.0
+        holdings = _tool_result(outputs["get_holdings"]) or {}
+        if holdings and rng.random() < 0.4:
+            symbol = rng.choice(sorted(holdings))
+            quantity = max(holdings[symbol] // 2, 1)
+            return self._call("stub-trade", "sell_shares", symbol=symbol, quantity=quantity, rationale="Stub rebalance")
+        prices = {symbol: simulated.price(symbol) for symbol in STUB_SYMBOLS}
+        symbol = rng.choice([symbol for symbol, price in prices.items() if price] or STUB_SYMBOLS)
+        quantity = int(balance * rng.uniform(0.05, 0.2) / prices[symbol]) if prices[symbol] else 0
+        if quantity < 1:
+            return self._reply("Holding cash today.")
+        return self._call("stub-trade", "buy_shares", symbol=symbol, quantity=quantity, rationale="Stub purchase")
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        items = input if isinstance(input, list) else []
+        names_by_call = {item["call_id"]: item["name"] for item in items if item.get("type") == "function_call"}
+        outputs = {
+            names_by_call.get(item["call_id"]): item["output"]
+            for item in items
+            if item.get("type") == "function_call_output"
+        }
+        if "buy_shares" in outputs or "sell_shares" in outputs:
+            output = [self._reply("Trades complete.")]
+        elif "get_holdings" in outputs:
+            output = [self._decide(outputs)]
+        else:
+            output = [self._call("stub-balance", "get_balance"), self._call("stub-holdings", "get_holdings")]
+        return ModelResponse(output=output, usage=Usage(), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        """The same turn as get_response, as a single completed event"""
+        response = await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+        )
+        yield ResponseCompletedEvent(
+            response=Response(
+                id=FAKE_RESPONSES_ID,
+                created_at=0,
+                model="stub",
+                object="response",
+                output=response.output,
+                parallel_tool_calls=False,
+                tool_choice="auto",
+                tools=[],
+            ),
+            sequence_number=0,
+            type="response.completed",
+        )
+
+
+@function_tool
+def get_share_price(symbol: str) -> float:
+    """Get the share price of the given symbol as of the prior close.
+
+    Args:
+        symbol: The symbol of the stock
+    """
+    return market.get_share_price(symbol)
+
+
+class BacktestTrader(Trader):
+    """A Trader with only the in-process accounts tools and a price lookup, run against the simulation"""
+
+    def __init__(self, name: str, lastname: str, model_name: str, offline: bool):
+        super().__init__(name, lastname, model_name)
+        self.model = StubModel(name.lower()) if offline else get_model(model_name)
+
+    async def create_agent(self, *args) -> Agent:
+        self.agent = Agent(
+            name=self.name,
+            instructions=backtest_instructions(self.name),
+            model=self.model,
+            tools=[get_share_price] + await get_accounts_tools_local(),
+        )
+        return self.agent
+
+    async def get_account_report(self, pool=None) -> str:
+        account_json = json.loads(await read_accounts_resource_local(self.name))
+        account_json.pop("portfolio_value_time_series", None)
+        return json.dumps(account_json)
+
+    async def get_strategy(self, pool=None) -> str:
+        return await read_strategy_resource_local(self.name)
+
+    async def run_with_trace(self, pool=None):
+        await self.create_agent()
+        account = await self.get_account_report()
+        strategy = await self.get_strategy()
+        message = (
+            backtest_trade_message(self.name, strategy, account)
+            if self.do_trade
+            else backtest_rebalance_message(self.name, strategy, account)
+        )
+        await Runner.run(self.agent, message, max_turns=MAX_TURNS)
+
+
+async def replay(trader: BacktestTrader, history: PriceHistory, limit: asyncio.Semaphore) -> None:
+    simulated = Simulation(history)
+    market.simulation.set(simulated)
+    for day in history.days:
+        async with limit:
+            simulated.advance(day)
+            await trader.run()
+
+
+def summarize(traders: list[BacktestTrader], history: PriceHistory) -> None:
+    simulated = Simulation(history)
+    simulated.advance(history.days[-1])
+    token = market.simulation.set(simulated)
+    try:
+        print(f"{'trader':<10}{'value':>12}{'return':>9}{'max dd':>9}{'sharpe':>8}{'trades':>8}")
+        for trader in traders:
+            metrics = get_analytics(Account.get(trader.name))
+            value = metrics.get("portfolio_value", INITIAL_BALANCE)
+            sharpe = metrics.get("sharpe_ratio")
+            print(
+                f"{trader.name:<10}{value:>12,.2f}{value / INITIAL_BALANCE - 1:>9.1%}"
+                f"{metrics.get('max_drawdown', 0.0):>9.1%}{sharpe if sharpe is not None else float('nan'):>8.2f}"
+                f"{metrics['trades']:>8}"
+            )
+    finally:
+        market.simulation.reset(token)
+
+
+async def run_backtest(
+    start: str,
+    end: str,
+    store: str | None = None,
+    results: str = RESULTS_DB,
+    parallelism: int = BACKTEST_PARALLELISM,
+    offline: bool = False,
+    only: list[str] | None = None,
+) -> None:
+    history = load_price_history(start, end, store)
+    if not history.days:
+        print(f"No market data between {start} and {end}; nothing to replay")
+        return
+    print(f"Replaying {len(history.days)} days from {history.days[0]} to {history.days[-1]} into {results}")
+
+    # From here on every account, transaction and log is read from and written to the results database
+    database.DB = results
+    reset_traders()
+    if offline:
+        set_tracing_disabled(True)
+
+    traders = [
+        BacktestTrader(name, lastname, model_name, offline)
+        for name, lastname, model_name in zip(names, lastnames, model_names)
+        if not only or name.lower() in only
+    ]
+    limit = asyncio.Semaphore(parallelism)
+    await asyncio.gather(*[replay(trader, history, limit) for trader in traders])
+    summarize(traders, history)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the traders against stored market data")
+    parser.add_argument("start", help="First day, YYYY-MM-DD")
+    parser.add_argument("end", help="Last day, YYYY-MM-DD")
+    parser.add_argument("--store", help="CSV or Parquet file, or directory of them, to fill gaps in the market table")
+    parser.add_argument("--results", default=RESULTS_DB, help="Database for the backtest accounts")
+    parser.add_argument("--parallelism", type=int, default=BACKTEST_PARALLELISM)
+    parser.add_argument("--offline", action="store_true", help="Use the deterministic stub model")
+    parser.add_argument("--traders", help="Comma separated names, default all")
+    args = parser.parse_args()
+    only = [name.strip().lower() for name in args.traders.split(",")] if args.traders else None
+    asyncio.run(
+        run_backtest(args.start, args.end, args.store, args.results, args.parallelism, args.offline, only)
+    )
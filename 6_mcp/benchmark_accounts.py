@@ -0,0 +1,65 @@
+"""
+Latency comparison for the two accounts transports: tools served by accounts_server.py over stdio MCP,
+against the same tools called in-process (ACCOUNTS_TRANSPORT=local). Both run against a scratch database.
+
+Usage: uv run benchmark_accounts.py [iterations]
+"""
+
+import os
+import sys
+import asyncio
+import statistics
+import tempfile
+import time
+from mcp import StdioServerParameters
+import database
+from accounts_client import AccountsClient
+from accounts_local import call_accounts_tool_local, read_strategy_resource_local
+
+NAME = "bench"
+
+CALLS = [
+    ("get_balance", {"name": NAME}),
+    ("get_holdings", {"name": NAME}),
+    ("change_strategy", {"name": NAME, "strategy": "Benchmarking"}),
+]
+
+
+async def time_calls(call, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def describe(timings: list[float]) -> str:
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    return f"{statistics.median(timings):>9.2f}{p95:>9.2f}"
+
+
+async def run(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        database.DB = os.path.join(directory, "accounts.db")
+        server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "accounts_server.py")
+        client = AccountsClient(StdioServerParameters(command=sys.executable, args=[server], cwd=directory))
+        startup = time.perf_counter()
+        await client.session()
+        print(f"stdio server startup: {(time.perf_counter() - startup) * 1000:.0f} ms\n")
+
+        print(f"{'operation':<24}{'stdio p50':>9}{'p95':>9}{'local p50':>11}{'p95':>9}  (ms)")
+        for tool_name, tool_args in CALLS:
+            stdio = await time_calls(lambda: client.call_tool(tool_name, tool_args), iterations)
+            local = await time_calls(lambda: call_accounts_tool_local(tool_name, tool_args), iterations)
+            print(f"{tool_name:<24}{describe(stdio)}  {describe(local)}")
+
+        stdio = await time_calls(lambda: client.read_resource(f"accounts://strategy/{NAME}"), iterations)
+        local = await time_calls(lambda: read_strategy_resource_local(NAME), iterations)
+        print(f"{'read_strategy_resource':<24}{describe(stdio)}  {describe(local)}")
+        await client.close()
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
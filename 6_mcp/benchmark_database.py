@@ -0,0 +1,114 @@
+"""
+Micro-benchmark for database.py: compares ops/sec for the old pattern of one new connection per call
+against the pooled, WAL-mode connection layer. Runs against a scratch database, never accounts.db.
+
+Usage: uv run benchmark_database.py [iterations]
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import time
+import database
+
+ACCOUNT = {
+    "name": "bench",
+    "balance": 10_000.0,
+    "strategy": "",
+    "holdings": {"AAPL": 10},
+    "net_invested": 1_500.0,
+    "realized_profit_loss": 0.0,
+    "cost_basis": {"AAPL": 150.0},
+}
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE accounts (name TEXT PRIMARY KEY, account TEXT)",
+    "CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, datetime DATETIME, type TEXT, message TEXT)",
+]
+
+
+def connect_per_call_write_log(path, name, type, message):
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO logs (name, datetime, type, message) VALUES (?, datetime('now'), ?, ?)",
+            (name, type, message),
+        )
+        conn.commit()
+
+
+def connect_per_call_read_log(path, name, last_n=13):
+    with sqlite3.connect(path) as conn:
+        cursor = conn.execute(
+            "SELECT datetime, type, message FROM logs WHERE name = ? ORDER BY datetime DESC LIMIT ?",
+            (name, last_n),
+        )
+        return cursor.fetchall()
+
+
+def connect_per_call_write_account(path, name, account):
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO accounts (name, account) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET account=excluded.account",
+            (name, json.dumps(account)),
+        )
+        conn.commit()
+
+
+def connect_per_call_read_account(path, name):
+    with sqlite3.connect(path) as conn:
+        row = conn.execute("SELECT account FROM accounts WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def ops_per_second(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def run(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        before_path = os.path.join(directory, "before.db")
+        after_path = os.path.join(directory, "after.db")
+        # The "before" file uses the original schema and is reopened per call in rollback-journal mode
+        with sqlite3.connect(before_path) as conn:
+            for statement in LEGACY_SCHEMA:
+                conn.execute(statement)
+        database.DB = after_path
+
+        cases = [
+            (
+                "write_log",
+                lambda: connect_per_call_write_log(before_path, "bench", "trace", "Started: bench"),
+                lambda: database.write_log("bench", "trace", "Started: bench"),
+            ),
+            (
+                "read_log",
+                lambda: connect_per_call_read_log(before_path, "bench"),
+                lambda: list(database.read_log("bench", last_n=13)),
+            ),
+            (
+                "write_account",
+                lambda: connect_per_call_write_account(before_path, "bench", ACCOUNT),
+                lambda: database.write_account("bench", ACCOUNT),
+            ),
+            (
+                "read_account",
+                lambda: connect_per_call_read_account(before_path, "bench"),
+                lambda: database.read_account("bench"),
+            ),
+        ]
+
+        print(f"{'operation':<16}{'before ops/s':>16}{'after ops/s':>16}{'speedup':>10}")
+        for label, before, after in cases:
+            before_rate = ops_per_second(before, iterations)
+            after_rate = ops_per_second(after, iterations)
+            print(f"{label:<16}{before_rate:>16,.0f}{after_rate:>16,.0f}{after_rate / before_rate:>9.1f}x")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
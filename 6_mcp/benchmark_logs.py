@@ -0,0 +1,65 @@
+"""
+Dashboard refresh latency over a growing synthetic logs table: the original query, which scans the table
+and sorts by datetime, against the indexed query ordered by id. Runs against a scratch database.
+
+Usage: uv run benchmark_logs.py [rows]   (defaults to 10,000,000; needs around 1GB of disk at that size)
+"""
+
+import os
+import sys
+import sqlite3
+import statistics
+import tempfile
+import time
+import database
+
+NAMES = ["warren", "george", "ray", "cathie"]
+INSERT_BATCH = 100_000
+REPEATS = 20
+
+ORIGINAL_QUERY = """
+    SELECT datetime, type, message FROM logs NOT INDEXED
+    WHERE name = ?
+    ORDER BY datetime DESC
+    LIMIT 13
+"""
+
+
+def insert_rows(conn: sqlite3.Connection, start: int, count: int) -> None:
+    rows = [
+        (NAMES[i % len(NAMES)], f"2025-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}", "trace", f"Entry {i}")
+        for i in range(start, start + count)
+    ]
+    with conn:
+        conn.executemany("INSERT INTO logs (name, datetime, type, message) VALUES (?, ?, ?, ?)", rows)
+
+
+def median_ms(fn) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(total: int):
+    with tempfile.TemporaryDirectory() as directory:
+        database.DB = os.path.join(directory, "logs.db")
+        conn = database.get_connection()
+        checkpoints = [size for size in [10_000, 100_000, 1_000_000, 10_000_000] if size < total] + [total]
+        print(f"{'rows':>12}{'original ms':>14}{'indexed ms':>13}")
+        inserted = 0
+        for checkpoint in checkpoints:
+            while inserted < checkpoint:
+                count = min(INSERT_BATCH, checkpoint - inserted)
+                insert_rows(conn, inserted, count)
+                inserted += count
+            original = median_ms(lambda: conn.execute(ORIGINAL_QUERY, ("cathie",)).fetchall())
+            indexed = median_ms(lambda: list(database.read_log("cathie", last_n=13)))
+            print(f"{inserted:>12,}{original:>14.2f}{indexed:>13.3f}")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
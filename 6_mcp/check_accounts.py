@@ -0,0 +1,33 @@
+"""
+Consistency check for the running P&L aggregates: replays each account's transaction ledger
+and reports any holdings, net invested, realized P&L or cost basis that disagree with the stored values.
+
+Usage: uv run check_accounts.py [--fix]
+"""
+
+import sys
+from accounts import Account
+from database import list_accounts
+
+
+def check_accounts(fix: bool = False) -> bool:
+    consistent = True
+    for name in list_accounts():
+        account = Account.get(name)
+        problems = account.check_consistency()
+        if not problems:
+            print(f"{name}: OK ({len(account.transactions)} transactions)")
+            continue
+        consistent = False
+        print(f"{name}: {len(problems)} mismatches")
+        for problem in problems:
+            print(f"  {problem}")
+        if fix:
+            account.rebuild_aggregates()
+            account.save()
+            print("  rebuilt aggregates from the ledger")
+    return consistent
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_accounts(fix="--fix" in sys.argv) else 1)
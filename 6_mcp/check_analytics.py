@@ -0,0 +1,76 @@
+"""
+Check for the annualized analytics: builds a synthetic portfolio value series with irregular timestamps,
+bursts of points seconds apart within a cycle, then gaps of hours or whole weekends, and reports whether
+volatility, Sharpe and Sortino match the same series with only each day's last point, and whether feeding
+the points in one at a time gives the same answer as all at once. Touches no database.
+
+Usage: uv run check_analytics.py [days]   (defaults to 60)
+"""
+
+import sys
+import math
+import random
+from datetime import datetime, timedelta
+from analytics import PortfolioAnalytics
+
+START = datetime(2025, 1, 6, 9, 30)
+CHECKED = ["volatility", "sharpe_ratio", "sortino_ratio"]
+
+
+def uneven_series(days: int) -> list[tuple[str, float]]:
+    """A random walk reported at irregular times: a few cycles a weekday, each a burst of points seconds apart"""
+    rng = random.Random(0)
+    value = 10_000.0
+    series = []
+    for day in range(days):
+        date = START + timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        when = date
+        for _ in range(rng.randint(1, 4)):
+            when += timedelta(minutes=rng.uniform(20, 120))
+            for _ in range(rng.randint(1, 6)):
+                when += timedelta(seconds=rng.uniform(1, 10))
+                value *= rng.lognormvariate(0, 0.004)
+                series.append((when.isoformat(sep=" ", timespec="seconds"), value))
+    return series
+
+
+def daily_closes(series: list[tuple[str, float]]) -> list[tuple[str, float]]:
+    closes = {}
+    for when, value in series:
+        closes[when[:10]] = (when, value)
+    return list(closes.values())
+
+
+def metrics(series: list[tuple[str, float]], one_at_a_time: bool = False) -> dict:
+    analytics = PortfolioAnalytics("check")
+    for end in range(1, len(series) + 1) if one_at_a_time else [len(series)]:
+        analytics.update(series[:end], [])
+    return analytics.metrics()
+
+
+def close(a: float | None, b: float | None) -> bool:
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9)
+
+
+def check_analytics(days: int = 60) -> bool:
+    series = uneven_series(days)
+    expected = metrics(daily_closes(series))
+    runs = {"all points": metrics(series), "one at a time": metrics(series, one_at_a_time=True)}
+    consistent = True
+    for run, result in runs.items():
+        mismatches = [key for key in CHECKED if not close(result.get(key), expected.get(key))]
+        if mismatches:
+            consistent = False
+            print(f"{run}: {', '.join(f'{key} {result.get(key)} != {expected.get(key)}' for key in mismatches)}")
+        else:
+            sharpe = result.get("sharpe_ratio")
+            print(f"{run}: OK ({len(series)} points, Sharpe {'n/a' if sharpe is None else f'{sharpe:.3f}'})")
+    return consistent
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_analytics(int(sys.argv[1]) if len(sys.argv) > 1 else 60) else 1)
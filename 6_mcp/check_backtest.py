@@ -0,0 +1,85 @@
+"""
+Determinism check for offline backtests: runs backtest.py --offline twice over the same synthetic prices,
+each in its own scratch directory and results database, and reports any trader whose trades or final
+account differ between the runs. Never touches accounts.db or the price store.
+
+Usage: uv run check_backtest.py [days]   (defaults to 20)
+"""
+
+import os
+import sys
+import csv
+import random
+import sqlite3
+import subprocess
+import tempfile
+from datetime import date, timedelta
+
+BACKTEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backtest.py")
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "SPY", "QQQ"]
+START = date(2025, 1, 6)
+
+
+def write_prices(path: str, days: int) -> list[str]:
+    """A random walk of closes for each symbol over the weekdays from START; returns the dates"""
+    rng = random.Random(0)
+    closes = {symbol: rng.uniform(50, 500) for symbol in SYMBOLS}
+    dates = []
+    day = START
+    while len(dates) < days:
+        if day.weekday() < 5:
+            dates.append(day.isoformat())
+        day += timedelta(days=1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "symbol", "close"])
+        for when in dates:
+            for symbol in SYMBOLS:
+                closes[symbol] *= rng.lognormvariate(0, 0.02)
+                writer.writerow([when, symbol, round(closes[symbol], 2)])
+    return dates
+
+
+def run_backtest(directory: str, prices: str, dates: list[str]) -> dict[str, tuple]:
+    """Run an offline backtest in directory; returns each trader's final account and trades"""
+    results = os.path.join(directory, "backtest.db")
+    subprocess.run(
+        [sys.executable, BACKTEST, dates[0], dates[-1], "--store", prices, "--results", results, "--offline"],
+        cwd=directory,
+        env={**os.environ, "PRICE_STORE_DIR": os.path.join(directory, "prices")},
+        check=True,
+        capture_output=True,
+    )
+    with sqlite3.connect(results) as conn:
+        accounts = conn.execute("SELECT name, balance, holdings FROM accounts").fetchall()
+        transactions = conn.execute(
+            "SELECT name, symbol, quantity, price, timestamp FROM transactions ORDER BY id"
+        ).fetchall()
+    return {
+        name: (balance, holdings, [t[1:] for t in transactions if t[0] == name])
+        for name, balance, holdings in accounts
+    }
+
+
+def check_backtest(days: int = 20) -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        prices = os.path.join(directory, "prices.csv")
+        dates = write_prices(prices, days)
+        runs = []
+        for run in ("first", "second"):
+            os.makedirs(os.path.join(directory, run))
+            runs.append(run_backtest(os.path.join(directory, run), prices, dates))
+    first, second = runs
+    consistent = bool(first) and first.keys() == second.keys()
+    for name in sorted(first):
+        balance, holdings, trades = first[name]
+        if first[name] == second.get(name):
+            print(f"{name}: OK ({len(trades)} trades, balance {balance:,.2f})")
+        else:
+            consistent = False
+            print(f"{name}: runs differ")
+    return consistent
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_backtest(int(sys.argv[1]) if len(sys.argv) > 1 else 20) else 1)
@@ -0,0 +1,72 @@
+"""
+Lost update check for account saves: loads the same account on two connections, saves a change from each,
+and reports whether the stale second save was rejected rather than overwriting the first, and whether
+AccountCache.run reran an operation that lost the race so both changes land. Uses a scratch database,
+never accounts.db.
+
+Usage: uv run check_versions.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import database
+from accounts import Account, AccountCache
+from database import VersionConflict, close_connections
+
+
+def on_other_connection(operation) -> None:
+    """Run an operation in another thread, which has its own connection, as another process would"""
+    thread = threading.Thread(target=operation)
+    thread.start()
+    thread.join()
+
+
+def check_stale_save() -> bool:
+    first = Account.get("versions")
+    second = Account.get("versions")
+    on_other_connection(lambda: first.deposit(100))
+    second.balance += 50
+    try:
+        second.save()
+    except VersionConflict:
+        balance = Account.get("versions").balance
+        print(f"stale save: OK (rejected; balance {balance:,.2f} keeps the first deposit)")
+        return balance == first.balance
+    print("stale save: overwrote the first deposit")
+    return False
+
+
+def check_retry() -> bool:
+    accounts = AccountCache()
+    before = accounts.get("versions").balance
+    attempts = []
+
+    def deposit(account: Account) -> None:
+        attempts.append(account.version)
+        if len(attempts) == 1:
+            # Another connection saves while this operation holds a copy loaded before it
+            on_other_connection(lambda: Account.get("versions").deposit(100))
+        account.deposit(50)
+
+    accounts.run("versions", deposit)
+    balance = Account.get("versions").balance
+    if balance == before + 150 and len(attempts) == 2:
+        print(f"retry: OK (rerun on version {attempts[1]} after losing to a save; balance {balance:,.2f})")
+        return True
+    print(f"retry: balance {balance:,.2f} after {len(attempts)} attempts, expected {before + 150:,.2f} after 2")
+    return False
+
+
+def check_versions() -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        database.DB = os.path.join(directory, "accounts.db")
+        try:
+            return check_stale_save() & check_retry()
+        finally:
+            close_connections()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_versions() else 1)
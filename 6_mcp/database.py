@@ -1,17 +1,67 @@
+import os
 import sqlite3
+import threading
 import json
-from datetime import datetime
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
 DB = "accounts.db"
 
+# Connection tuning: WAL lets the traders, the LogTracer and the Gradio app read while another writes,
+# and busy_timeout makes a writer wait for the lock instead of failing with "database is locked"
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
+BUSY_TIMEOUT_MS = 5_000
+MMAP_SIZE = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+# Log entries older than this are rolled into logs_archive by archive_logs()
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "7"))
+LOG_ARCHIVE_BATCH_SIZE = 10_000
+
+# Span timings that started longer ago than this are deleted by prune_metrics()
+
+METRICS_RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", "7"))
+
+SCHEMA = [
+    """
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            balance REAL NOT NULL,
+            strategy TEXT NOT NULL DEFAULT '',
+            holdings TEXT NOT NULL DEFAULT '{}',
+            net_invested REAL,
+            realized_profit_loss REAL,
+            cost_basis TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            rationale TEXT NOT NULL
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS transactions_by_name ON transactions (name, id)",
+    """
+        CREATE TABLE IF NOT EXISTS portfolio_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS portfolio_values_by_name ON portfolio_values (name, id)",
+    """
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -19,83 +69,575 @@ with sqlite3.connect(DB) as conn:
             type TEXT,
             message TEXT
         )
-    ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
+    """,
+    "CREATE INDEX IF NOT EXISTS logs_by_name ON logs (name, id)",
+    """
+        CREATE TABLE IF NOT EXISTS logs_archive (
+            day TEXT NOT NULL,
+            name TEXT NOT NULL,
+            entries INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (day, name)
+        )
+    """,
+    "CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)",
+    """
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            trace_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            label TEXT,
+            server TEXT,
+            started TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            error TEXT
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS metrics_by_name ON metrics (name, kind, id)",
+    "CREATE INDEX IF NOT EXISTS metrics_by_started ON metrics (started)",
+]
+
+# Columns added to accounts after the normalized schema shipped. Older files gain the P&L aggregates as NULL,
+# and Account rebuilds them from the ledger on first load. The version is bumped on every write, so a process
+# holding an account in memory can tell cheaply whether another process has changed it
+
+ACCOUNT_COLUMNS = {
+    "net_invested": "REAL",
+    "realized_profit_loss": "REAL",
+    "cost_basis": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Columns added to logs so entries can be grouped by the trader run they came from: its trace, the trader's
+# cycle number and whether it was trading or rebalancing. Entries written before have them as NULL
+
+LOG_COLUMNS = {
+    "trace_id": "TEXT",
+    "cycle": "INTEGER",
+    "mode": "TEXT",
+}
+
+ACCOUNT_FIELDS = ["balance", "strategy", "holdings", "net_invested", "realized_profit_loss", "cost_basis"]
+JSON_FIELDS = {"holdings", "cost_basis"}
+
+_local = threading.local()
+_lock = threading.Lock()
+_connections: list[sqlite3.Connection] = []
+# Bumped by close_connections, so every thread drops its closed handles and reconnects on its next call
+_generation = 0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    migrate_legacy_accounts(conn)
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+    _add_columns(conn, "accounts", ACCOUNT_COLUMNS)
+    _add_columns(conn, "logs", LOG_COLUMNS)
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS logs_by_cycle ON logs (name, cycle)")
+    return conn
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, added: dict[str, str]) -> None:
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column, type in added.items():
+        if column not in columns:
+            try:
+                with conn:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type}")
+            except sqlite3.OperationalError as e:
+                # Another process added it first
+                if "duplicate column" not in str(e):
+                    raise
+
+
+def _is_legacy(conn: sqlite3.Connection) -> bool:
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(accounts)")]
+    return "account" in columns
+
+
+def migrate_legacy_accounts(conn: sqlite3.Connection) -> int:
+    """
+    Convert an accounts table holding one JSON blob per account into the normalized schema:
+    a compact accounts row, plus append-only transactions and portfolio_values tables.
+    Safe to run repeatedly, and from several processes at once.
+
+    Args:
+        conn (sqlite3.Connection): A connection to the database to migrate
+
+    Returns:
+        int: The number of accounts converted; 0 if the database was already migrated
+    """
+    if not _is_legacy(conn):
+        return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not _is_legacy(conn):
+            conn.rollback()
+            return 0
+        conn.execute("ALTER TABLE accounts RENAME TO accounts_legacy")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        rows = conn.execute("SELECT name, account FROM accounts_legacy").fetchall()
+        for name, data in rows:
+            account = json.loads(data)
+            conn.execute(
+                "INSERT INTO accounts (name, balance, strategy, holdings) VALUES (?, ?, ?, ?)",
+                (name, account["balance"], account["strategy"], json.dumps(account["holdings"])),
+            )
+            conn.executemany(
+                "INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+                    for t in account.get("transactions", [])
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)",
+                [(name, when, value) for when, value in account.get("portfolio_value_time_series", [])],
+            )
+        conn.execute("DROP TABLE accounts_legacy")
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def get_connection(path: str | None = None) -> sqlite3.Connection:
+    """
+    Return the pooled connection for this thread, opening it on first use.
+
+    Connections are held per process and per thread, so a forked child never reuses its parent's handle
+    and no connection is shared between threads. Each connection keeps sqlite3's prepared statement cache
+    warm, so the fixed SQL strings below are compiled once rather than on every call.
+
+    Args:
+        path (str): The database file; defaults to DB
+
+    Returns:
+        sqlite3.Connection: Use it as a context manager to commit, or roll back on error
+    """
+    path = path or DB
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid or _local.generation != _generation:
+        _local.pid = pid
+        _local.generation = _generation
+        _local.connections = {}
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = _connect(path)
+        _local.connections[path] = conn
+        with _lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connections() -> None:
+    """
+    Close every connection opened by this process, for a clean shutdown.
+    Any thread that calls in afterwards opens a fresh connection rather than reusing a closed one.
+    """
+    global _generation
+    with _lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _generation += 1
+    _local.__dict__.clear()
+
+
+class VersionConflict(Exception):
+    """The account was saved by another process or connection after the copy being written was loaded"""
+
+
+def write_account(name, account_dict, transactions=(), portfolio_values=(), version=None) -> int:
+    """
+    Save the account row and append any new history, all in one transaction.
+    A new account needs every field; an existing one can be given just the fields that changed.
+    Raises ValueError if only some fields are given for an account that doesn't exist.
+
+    Given the version the caller loaded, the write only goes ahead if the row is still at that version,
+    and raises VersionConflict otherwise, so a change saved in between is never silently overwritten.
+
+    Args:
+        name (str): The account name
+        account_dict (dict): Any of the balance, strategy, holdings and running P&L aggregates
+        transactions (list): New transaction dicts to append to the ledger
+        portfolio_values (list): New (datetime, value) points to append to the time series
+        version (int): The version the account was loaded at, 0 for a new account; None to write regardless
+
+    Returns:
+        int: The account's new version
+    """
+    name = name.lower()
+    values = {
+        field: json.dumps(value) if field in JSON_FIELDS else value
+        for field, value in account_dict.items()
+        if field in ACCOUNT_FIELDS
+    }
+    guarded = version is not None
+    guard_values = (version,) if guarded else ()
+    with get_connection() as conn:
+        if len(values) == len(ACCOUNT_FIELDS):
+            cursor = conn.execute(f'''
+                INSERT INTO accounts (name, {", ".join(values)}, version)
+                VALUES (?, {", ".join("?" for _ in values)}, 1)
+                ON CONFLICT(name) DO UPDATE SET
+                    {", ".join(f"{field}=excluded.{field}" for field in values)}, version=accounts.version + 1
+                {"WHERE accounts.version = ?" if guarded else ""}
+            ''', (name, *values.values(), *guard_values))
+        else:
+            cursor = conn.execute(f'''
+                UPDATE accounts SET {"".join(f"{field}=?, " for field in values)}version=version + 1
+                WHERE name = ? {"AND version = ?" if guarded else ""}
+            ''', (*values.values(), name, *guard_values))
+        if cursor.rowcount == 0:
+            current = conn.execute('SELECT version FROM accounts WHERE name = ?', (name,)).fetchone()
+            if current is None:
+                missing = [field for field in ACCOUNT_FIELDS if field not in values]
+                raise ValueError(f"No account named {name} to update; a new account needs {', '.join(missing)}")
+            raise VersionConflict(f"Account {name} is at version {current[0]}, not {version}; reload it and try again")
+        if transactions:
+            conn.executemany('''
+                INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"]) for t in transactions])
+        if portfolio_values:
+            conn.executemany('''
+                INSERT INTO portfolio_values (name, datetime, value)
+                VALUES (?, ?, ?)
+            ''', [(name, when, value) for when, value in portfolio_values])
+        return conn.execute('SELECT version FROM accounts WHERE name = ?', (name,)).fetchone()[0]
+
+def read_account_version(name) -> int | None:
+    """The account's version, a cheap check for whether a cached copy is still current"""
+    with get_connection() as conn:
+        row = conn.execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+        return row[0] if row else None
 
 def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT name, balance, strategy, holdings, net_invested, realized_profit_loss, cost_basis, version
+            FROM accounts WHERE name = ?
+        ''', (name.lower(),))
         row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+        if not row:
+            return None
+        return {
+            "name": row[0],
+            "balance": row[1],
+            "strategy": row[2],
+            "holdings": json.loads(row[3]),
+            "net_invested": row[4],
+            "realized_profit_loss": row[5],
+            "cost_basis": json.loads(row[6]) if row[6] is not None else None,
+            "version": row[7],
+        }
+
+def list_accounts() -> list[str]:
+    with get_connection() as conn:
+        cursor = conn.execute('SELECT name FROM accounts ORDER BY name')
+        return [row[0] for row in cursor.fetchall()]
+
+def clear_account_history(name):
+    """Delete the transactions and portfolio values recorded for an account"""
+    with get_connection() as conn:
+        conn.execute('DELETE FROM transactions WHERE name = ?', (name.lower(),))
+        conn.execute('DELETE FROM portfolio_values WHERE name = ?', (name.lower(),))
+
+def read_transactions(name) -> list[dict]:
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+            WHERE name = ?
+            ORDER BY id
+        ''', (name.lower(),))
+        columns = ["symbol", "quantity", "price", "timestamp", "rationale"]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def read_portfolio_values(name) -> list[tuple[str, float]]:
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT datetime, value FROM portfolio_values
+            WHERE name = ?
+            ORDER BY id
+        ''', (name.lower(),))
+        return cursor.fetchall()
+
 def write_log(name: str, type: str, message: str):
     """
     Write a log entry to the logs table.
-    
+
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with get_connection() as conn:
+        conn.execute('''
             INSERT INTO logs (name, datetime, type, message)
             VALUES (?, datetime('now'), ?, ?)
         ''', (name.lower(), type, message))
-        conn.commit()
+
+def log_timestamp() -> str:
+    """The current UTC time in the same format as SQLite's datetime('now')"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def write_logs(entries: list[tuple]):
+    """
+    Write a batch of log entries to the logs table in a single transaction.
+
+    Args:
+        entries (list): Tuples of (name, datetime, type, message), with datetime from log_timestamp(),
+            optionally followed by the (trace_id, cycle, mode) of the run that wrote them
+    """
+    rows = [(entry[0].lower(), *entry[1:], *(None,) * (7 - len(entry))) for entry in entries]
+    with get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO logs (name, datetime, type, message, trace_id, cycle, mode)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
 
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
-    
+
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-        
+
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT datetime, type, message FROM logs
+            WHERE name = ?
+            ORDER BY id DESC
             LIMIT ?
         ''', (name.lower(), last_n))
-        
+
         return reversed(cursor.fetchall())
 
+def read_log_entries(name: str, last_n=10):
+    """
+    Read the most recent log entries for a given name, with their ids.
+
+    Returns:
+        list: A list of tuples containing (id, datetime, type, message), oldest first
+    """
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT id, datetime, type, message FROM logs
+            WHERE name = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (name.lower(), last_n))
+        return list(reversed(cursor.fetchall()))
+
+def read_cycle_log(name: str, cycle: int):
+    """
+    Read every log entry written during one of a trader's cycles.
+
+    Returns:
+        list: A list of tuples containing (datetime, type, message, mode), oldest first
+    """
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT datetime, type, message, mode FROM logs
+            WHERE name = ? AND cycle = ?
+            ORDER BY id
+        ''', (name.lower(), cycle))
+        return cursor.fetchall()
+
+def read_latest_cycle(name: str) -> int:
+    """The highest cycle number logged for a trader, or 0 if it has none"""
+    with get_connection() as conn:
+        row = conn.execute('SELECT MAX(cycle) FROM logs WHERE name = ?', (name.lower(),)).fetchone()
+        return row[0] or 0
+
+def read_latest_log_id() -> int:
+    with get_connection() as conn:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM logs').fetchone()[0]
+
+def read_logs_since(last_id: int, limit=1000):
+    """
+    Read log entries for every name written after the given id, for tailing the log.
+
+    Returns:
+        list: A list of tuples containing (id, name, datetime, type, message), oldest first
+    """
+    with get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT id, name, datetime, type, message FROM logs
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, limit))
+        return cursor.fetchall()
+
+def archive_logs(retention_days: int = LOG_RETENTION_DAYS, batch_size: int = LOG_ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move log entries older than the retention period out of the logs table and into logs_archive,
+    as one zlib-compressed JSON row per day and name. Works from the oldest id forward in batches,
+    so each transaction is short and the check is a single indexed read when there is nothing to do.
+
+    Args:
+        retention_days (int): How many days of entries to keep in the logs table
+        batch_size (int): The most entries to move in one transaction
+
+    Returns:
+        int: The number of entries archived
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    archived = 0
+    while True:
+        with get_connection() as conn:
+            oldest = conn.execute('SELECT datetime FROM logs ORDER BY id LIMIT 1').fetchone()
+            if not oldest or oldest[0] >= cutoff:
+                break
+            rows = conn.execute('''
+                SELECT id, name, datetime, type, message FROM logs
+                ORDER BY id
+                LIMIT ?
+            ''', (batch_size,)).fetchall()
+            days = defaultdict(list)
+            last_id = None
+            for id, name, when, type, message in rows:
+                if when >= cutoff:
+                    break
+                days[(when[:10], name)].append((when, type, message))
+                last_id = id
+            for (day, name), entries in days.items():
+                existing = conn.execute(
+                    'SELECT data FROM logs_archive WHERE day = ? AND name = ?', (day, name)
+                ).fetchone()
+                if existing:
+                    entries = json.loads(zlib.decompress(existing[0])) + entries
+                conn.execute('''
+                    INSERT INTO logs_archive (day, name, entries, data)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(day, name) DO UPDATE SET entries=excluded.entries, data=excluded.data
+                ''', (day, name, len(entries), zlib.compress(json.dumps(entries).encode())))
+            conn.execute('DELETE FROM logs WHERE id <= ?', (last_id,))
+            moved = sum(len(entries) for entries in days.values())
+        archived += moved
+        if moved < batch_size:
+            break
+    return archived
+
+def read_archived_log(name: str, day: str) -> list:
+    """
+    Read the archived log entries for a name on a given day.
+
+    Returns:
+        list: A list of [datetime, type, message] entries, oldest first
+    """
+    with get_connection() as conn:
+        row = conn.execute(
+            'SELECT data FROM logs_archive WHERE day = ? AND name = ?', (day, name.lower())
+        ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else []
+
+METRIC_COLUMNS = [
+    "name", "trace_id", "kind", "label", "server", "started", "duration_ms", "input_tokens", "output_tokens", "error"
+]
+
+def write_metrics(rows: list[dict]):
+    """
+    Write a batch of span timings to the metrics table in a single transaction.
+
+    Args:
+        rows (list): Dicts with the METRIC_COLUMNS as keys; label, server, tokens and error may be None
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            f"INSERT INTO metrics ({', '.join(METRIC_COLUMNS)}) VALUES ({', '.join('?' * len(METRIC_COLUMNS))})",
+            [tuple(row.get(column) for column in METRIC_COLUMNS) for row in rows],
+        )
+
+def read_cycle_metrics(name: str, last_n=5) -> list[dict]:
+    """
+    Read every span timing from a trader's most recent cycles, one cycle being one trace.
+
+    Returns:
+        list: Dicts with the METRIC_COLUMNS as keys, oldest first
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT {', '.join(METRIC_COLUMNS)} FROM metrics
+            WHERE name = ? AND trace_id IN (
+                SELECT trace_id FROM metrics WHERE name = ? AND kind = 'trace' ORDER BY id DESC LIMIT ?
+            )
+            ORDER BY id
+        ''', (name.lower(), name.lower(), last_n))
+        return [dict(zip(METRIC_COLUMNS, row)) for row in cursor.fetchall()]
+
+def read_span_metrics(since: str) -> list[tuple]:
+    """
+    Read (kind, label, server, duration_ms) for every span that started at or after since, for latency histograms.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT kind, label, server, duration_ms FROM metrics WHERE started >= ? AND kind != 'trace'", (since,)
+        )
+        return cursor.fetchall()
+
+def prune_metrics(retention_days: int = METRICS_RETENTION_DAYS, batch_size: int = LOG_ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Delete span timings that started before the retention period, in batches so each transaction is short.
+
+    Returns:
+        int: The number of rows deleted
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+    deleted = 0
+    while True:
+        with get_connection() as conn:
+            cursor = conn.execute('''
+                DELETE FROM metrics WHERE id IN (SELECT id FROM metrics WHERE started < ? LIMIT ?)
+            ''', (cutoff, batch_size))
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+    return deleted
+
 def write_market(date: str, data: dict) -> None:
     data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with get_connection() as conn:
+        conn.execute('''
             INSERT INTO market (date, data)
             VALUES (?, ?)
             ON CONFLICT(date) DO UPDATE SET data=excluded.data
         ''', (date, data_json))
-        conn.commit()
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
+    with get_connection() as conn:
+        cursor = conn.execute('SELECT data FROM market WHERE date = ?', (date,))
         row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+        return json.loads(row[0]) if row else None
+
+def read_market_history(start: str, end: str, path: str | None = None) -> list[tuple[str, dict]]:
+    """Every stored market day from start to end inclusive, oldest first, in one query"""
+    with get_connection(path) as conn:
+        cursor = conn.execute(
+            'SELECT date, data FROM market WHERE date BETWEEN ? AND ? ORDER BY date', (start, end)
+        )
+        return [(date, json.loads(data)) for date, data in cursor.fetchall()]
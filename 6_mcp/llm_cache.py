@@ -0,0 +1,142 @@
+"""
+Record and replay of LLM responses, at the HTTP layer of the AsyncOpenAI clients made in traders.py.
+
+Each request is keyed by a hash of its endpoint and JSON body: the model, messages or input, tools and
+settings. Timestamps are masked before hashing, since every prompt carries the current datetime.
+With LLM_CACHE_MODE set:
+
+    record  call the provider and save each successful response under llm_cache/
+    replay  serve saved responses only; a request with no recording fails with a 404, without retries
+    auto    serve a saved response when there is one, otherwise call the provider and record it
+    off     (default) no caching
+
+A replay matches its recording as long as the tool results fed back to the model are the same too, as they
+are for a backtest (backtest.py), or for market data read from the price store within the same day.
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").strip().lower()
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+
+TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?")
+
+# Headers that describe the bytes on the wire rather than the decoded body that is saved
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def request_key(path: str, body: bytes) -> str:
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = body.decode(errors="replace")
+    canonical = TIMESTAMP.sub("<timestamp>", canonical)
+    return hashlib.sha256(f"{path}\n{canonical}".encode()).hexdigest()
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """An httpx transport that serves POST requests from disk when it can, and records them when it can't"""
+
+    def __init__(self, mode: str = LLM_CACHE_MODE, directory: str = LLM_CACHE_DIR, transport=None):
+        self.mode = mode
+        self.directory = directory
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, key: str, request: httpx.Request, response: httpx.Response, content: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        recording = {
+            "url": str(request.url),
+            "status_code": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in WIRE_HEADERS},
+            "body": content.decode(),
+        }
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(recording, f)
+        os.replace(temporary, path)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return await self.transport.handle_async_request(request)
+        key = request_key(request.url.path, await request.aread())
+
+        if self.mode in ("replay", "auto"):
+            recording = self._load(key)
+            if recording:
+                self._count("hits")
+                return httpx.Response(
+                    recording["status_code"],
+                    headers=recording["headers"],
+                    content=recording["body"].encode(),
+                    request=request,
+                )
+            self._count("misses")
+            if self.mode == "replay":
+                error = {"error": {"message": f"No recorded response for request {key} (LLM_CACHE_MODE=replay)"}}
+                return httpx.Response(404, json=error, request=request)
+
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in WIRE_HEADERS}
+        if response.status_code == 200:
+            self._save(key, request, response, content)
+            self._count("recorded")
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+_transport: RecordReplayTransport | None = None
+
+
+def get_transport() -> RecordReplayTransport | None:
+    """The process-wide record/replay transport, or None when LLM_CACHE_MODE is off"""
+    global _transport
+    if LLM_CACHE_MODE == "off":
+        return None
+    if _transport is None:
+        _transport = RecordReplayTransport()
+    return _transport
+
+
+def cached_http_client() -> httpx.AsyncClient | None:
+    """An http_client for AsyncOpenAI that goes through the cache, or None to use the client's own"""
+    transport = get_transport()
+    if transport is None:
+        return None
+    return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(600.0, connect=5.0), follow_redirects=True)
+
+
+def llm_cache_stats() -> dict:
+    transport = get_transport()
+    return transport.stats() if transport else {"mode": "off"}
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from database import read_log_entries, read_logs_since, read_latest_log_id
+
+POLL_SECONDS = 0.5
+
+
+class LogFeed:
+    """
+    A change feed over the logs table, shared by every dashboard session.
+
+    One background thread tails the table, asking only for rows with an id above the last one it has seen,
+    and keeps the most recent entries for each trader in memory. Sessions subscribe with changes(), which
+    watches in-memory version counters, so database load doesn't grow with the number of viewers.
+    """
+
+    def __init__(self, names: list[str], last_n: int = 13, poll_seconds: float = POLL_SECONDS):
+        self.last_n = last_n
+        self.poll_seconds = poll_seconds
+        self._entries = {name.lower(): deque(maxlen=last_n) for name in names}
+        self._versions = {name.lower(): 0 for name in names}
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread:
+                return
+            self._prime()
+            self._thread = threading.Thread(target=self._run, name="LogFeed", daemon=True)
+            self._thread.start()
+
+    def _prime(self) -> None:
+        self._last_id = read_latest_log_id()
+        for name, entries in self._entries.items():
+            entries.extend(read_log_entries(name, self.last_n))
+            self._versions[name] += 1
+
+    def _poll(self) -> None:
+        rows = read_logs_since(self._last_id)
+        with self._lock:
+            for id, name, *entry in rows:
+                entries = self._entries.get(name)
+                # Priming reads each trader separately, so skip anything already held
+                if entries is not None and (not entries or id > entries[-1][0]):
+                    entries.append((id, *entry))
+                    self._versions[name] += 1
+                self._last_id = max(self._last_id, id)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Error tailing logs: {e}")
+            time.sleep(self.poll_seconds)
+
+    def entries(self, name: str) -> list[tuple]:
+        """The most recent (id, datetime, type, message) entries for a trader, oldest first"""
+        with self._lock:
+            return list(self._entries.get(name.lower(), []))
+
+    async def changes(self):
+        """Yield the names whose entries have changed, starting with every name"""
+        seen = {}
+        while True:
+            with self._lock:
+                changed = [name for name, version in self._versions.items() if seen.get(name) != version]
+                seen.update({name: self._versions[name] for name in changed})
+            if changed:
+                yield changed
+            await asyncio.sleep(self.poll_seconds)
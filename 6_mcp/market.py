@@ -3,9 +3,12 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime
 import random
-from database import write_market, read_market
+from database import read_market
+from price_store import DayPrices, get_price_store
+from market_cache import TTLCache
 from functools import lru_cache
 from datetime import timezone
+from contextvars import ContextVar
 
 load_dotenv(override=True)
 
@@ -15,31 +18,70 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+# How long each kind of market data is reused before asking polygon again
+
+EOD_TTL_SECONDS = 24 * 60 * 60
+SNAPSHOT_TTL_SECONDS = float(os.getenv("MARKET_SNAPSHOT_TTL_SECONDS", "60"))
+MARKET_STATUS_TTL_SECONDS = 60
+
+eod_cache = TTLCache("eod", EOD_TTL_SECONDS, maxsize=2)
+snapshot_cache = TTLCache("snapshot", SNAPSHOT_TTL_SECONDS)
+market_status_cache = TTLCache("market_status", MARKET_STATUS_TTL_SECONDS, maxsize=1)
+
+
+# Set by backtest.py for the duration of a simulated run: prices and the clock then come from stored history.
+# A context variable, so traders replaying different days concurrently each see their own date
+
+simulation = ContextVar("simulation", default=None)
+
+
+def now() -> datetime:
+    """The current time, or the simulated time when running in a backtest"""
+    simulated = simulation.get()
+    return simulated.now() if simulated else datetime.now()
+
+
+@lru_cache(maxsize=1)
+def get_client() -> RESTClient:
+    """One RESTClient per process, so its HTTP connection pool is reused across calls"""
+    return RESTClient(polygon_api_key)
+
 
 def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
-    market_status = client.get_market_status()
-    return market_status.market == "open"
+    def load():
+        return get_client().get_market_status().market == "open"
 
+    return market_status_cache.get("market", load)
 
-def get_all_share_prices_polygon_eod() -> dict[str, float]:
+
+def get_grouped_daily_polygon_eod():
     """With much thanks to student Reema R. for fixing the timezone issue with this!"""
-    client = RESTClient(polygon_api_key)
+    client = get_client()
 
     probe = client.get_previous_close_agg("SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
 
-    results = client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
-    return {result.ticker: result.close for result in results}
+    return client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
+
+
+def get_all_share_prices_polygon_eod() -> dict[str, float]:
+    return {result.ticker: result.close for result in get_grouped_daily_polygon_eod()}
+
+
+def load_market_for_prior_date(today) -> DayPrices:
+    store = get_price_store()
+    if not store.has(today):
+        # A day saved to the market table before the price store existed is imported rather than fetched again
+        legacy = read_market(today)
+        if legacy:
+            store.ingest_closes(today, legacy)
+        else:
+            store.ingest_grouped_daily(today, get_grouped_daily_polygon_eod())
+    return store.day(today)
 
 
-@lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+def get_market_for_prior_date(today) -> DayPrices:
+    return eod_cache.get(today, lambda: load_market_for_prior_date(today))
 
 
 def get_share_price_polygon_eod(symbol) -> float:
@@ -48,12 +90,36 @@ def get_share_price_polygon_eod(symbol) -> float:
     return market_data.get(symbol, 0.0)
 
 
-def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
-    result = client.get_snapshot_ticker("stocks", symbol)
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    market_data = get_market_for_prior_date(today)
+    return {symbol: market_data.get(symbol, 0.0) for symbol in symbols}
+
+
+def load_share_price_polygon_min(symbol) -> float:
+    result = get_client().get_snapshot_ticker("stocks", symbol)
     return result.min.close or result.prev_day.close
 
 
+def load_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    """One snapshot request for the whole basket, rather than one per symbol"""
+    results = get_client().get_snapshot_all("stocks", tickers=symbols)
+    prices = {}
+    for result in results:
+        minute_close = result.min.close if result.min else None
+        prior_close = result.prev_day.close if result.prev_day else None
+        prices[result.ticker] = minute_close or prior_close or 0.0
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
+
+
+def get_share_price_polygon_min(symbol) -> float:
+    return snapshot_cache.get(symbol, lambda: load_share_price_polygon_min(symbol))
+
+
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    return snapshot_cache.get_many(symbols, load_share_prices_polygon_min)
+
+
 def get_share_price_polygon(symbol) -> float:
     if is_paid_polygon:
         return get_share_price_polygon_min(symbol)
@@ -61,10 +127,37 @@ def get_share_price_polygon(symbol) -> float:
         return get_share_price_polygon_eod(symbol)
 
 
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    if is_paid_polygon:
+        return get_share_prices_polygon_min(symbols)
+    else:
+        return get_share_prices_polygon_eod(symbols)
+
+
 def get_share_price(symbol) -> float:
+    simulated = simulation.get()
+    if simulated:
+        return simulated.price(symbol)
     if polygon_api_key:
         try:
             return get_share_price_polygon(symbol)
         except Exception as e:
             print(f"Was not able to use the polygon API due to {e}; using a random number")
     return float(random.randint(1, 100))
+
+
+def get_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Look up a basket of share prices in one pass, keyed by symbol"""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    simulated = simulation.get()
+    if simulated:
+        return {symbol: simulated.price(symbol) for symbol in symbols}
+    if polygon_api_key:
+        try:
+            return get_share_prices_polygon(symbols)
+        except Exception as e:
+            print(f"Was not able to use the polygon API due to {e}; using random numbers")
+    return {symbol: float(random.randint(1, 100)) for symbol in symbols}
+
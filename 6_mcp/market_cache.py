@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Iterable
+
+_caches: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    A thread-safe cache whose entries expire after a fixed number of seconds.
+
+    Concurrent misses on the same key are coalesced: the first caller runs the loader
+    and everyone else waits for its result, so a burst of traders asking for the same
+    symbol costs one API call rather than one each.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, maxsize: int = 10_000):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._entries: dict[Hashable, tuple[Any, float]] = {}
+        self._inflight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        _caches[name] = self
+
+    def _lookup(self, key: Hashable, now: float):
+        entry = self._entries.get(key)
+        if entry and entry[1] > now:
+            self.hits += 1
+            return True, entry[0]
+        return False, None
+
+    def _store(self, key: Hashable, value: Any, now: float) -> None:
+        if len(self._entries) >= self.maxsize and key not in self._entries:
+            expired = [k for k, (_, expires) in self._entries.items() if expires <= now]
+            for k in expired or [next(iter(self._entries))]:
+                del self._entries[k]
+        self._entries[key] = (value, now + self.ttl_seconds)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling loader() at most once across threads on a miss"""
+        return self.get_many([key], lambda keys: {key: loader()})[key]
+
+    def get_many(self, keys: Iterable[Hashable], loader: Callable[[list], dict]) -> dict:
+        """
+        Return cached values for all keys, calling loader(missing_keys) once for the keys
+        that are neither cached nor already being loaded by another thread.
+        The loader must return a dict with a value for every key it was given.
+        """
+        now = time.monotonic()
+        results, waiting, leading = {}, {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                found, value = self._lookup(key, now)
+                if found:
+                    results[key] = value
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    leading[key] = self._inflight[key] = Future()
+
+        if leading:
+            try:
+                loaded = loader(list(leading))
+                missing = [key for key in leading if key not in loaded]
+                if missing:
+                    raise KeyError(f"{self.name} loader returned no value for {missing}")
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    for key, future in leading.items():
+                        del self._inflight[key]
+                        future.set_exception(e)
+                raise
+            now = time.monotonic()
+            with self._lock:
+                for key, future in leading.items():
+                    self._store(key, loaded[key], now)
+                    del self._inflight[key]
+                    future.set_result(loaded[key])
+                    results[key] = loaded[key]
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+def cache_stats() -> dict[str, dict]:
+    """Hit/miss counters for every cache in this process, keyed by cache name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -1,5 +1,8 @@
 from mcp.server.fastmcp import FastMCP
-from market import get_share_price
+from market import get_share_price, get_share_prices
+from market_cache import cache_stats
+import asyncio
+import json
 
 mcp = FastMCP("market_server")
 
@@ -10,7 +13,21 @@ async def lookup_share_price(symbol: str) -> float:
     Args:
         symbol: the symbol of the stock
     """
-    return get_share_price(symbol)
+    return await asyncio.to_thread(get_share_price, symbol)
+
+@mcp.tool()
+async def lookup_share_prices(symbols: list[str]) -> dict[str, float]:
+    """This tool provides the current prices of several stock symbols in a single call.
+    Prefer it to repeated lookup_share_price calls when you need more than one price.
+
+    Args:
+        symbols: the symbols of the stocks
+    """
+    return await asyncio.to_thread(get_share_prices, symbols)
+
+@mcp.resource("market://cache_stats")
+async def read_cache_stats_resource() -> str:
+    return json.dumps(cache_stats())
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -7,6 +7,11 @@ load_dotenv(override=True)
 brave_env = {"BRAVE_API_KEY": os.getenv("BRAVE_API_KEY")}
 polygon_api_key = os.getenv("POLYGON_API_KEY")
 
+# "stdio" runs accounts_server.py as an MCP server; "local" gives the trader the same tools in-process
+
+accounts_transport = os.getenv("ACCOUNTS_TRANSPORT", "stdio").strip().lower()
+use_local_accounts = accounts_transport == "local"
+
 # The MCP server for the Trader to read Market Data
 
 if is_paid_polygon or is_realtime_polygon:
@@ -19,28 +24,35 @@ else:
     market_mcp = {"command": "uv", "args": ["run", "market_server.py"]}
 
 
-# The full set of MCP servers for the trader: Accounts, Push Notification and the Market
+# The full set of MCP servers for the trader: Accounts (unless in-process), Push Notification and the Market
 
-trader_mcp_server_params = [
-    {"command": "uv", "args": ["run", "accounts_server.py"]},
+accounts_mcp = {"command": "uv", "args": ["run", "accounts_server.py"]}
+
+trader_mcp_server_params = ([] if use_local_accounts else [accounts_mcp]) + [
     {"command": "uv", "args": ["run", "push_server.py"]},
     market_mcp,
 ]
 
 # The full set of MCP servers for the researcher: Fetch, Brave Search and Memory
+# Fetch and Brave Search can be shared between traders; each trader has its own Memory
+
+researcher_shared_mcp_server_params = [
+    {"command": "uvx", "args": ["mcp-server-fetch"]},
+    {
+        "command": "npx",
+        "args": ["-y", "@modelcontextprotocol/server-brave-search"],
+        "env": brave_env,
+    },
+]
+
+
+def memory_mcp_server_params(name: str):
+    return {
+        "command": "npx",
+        "args": ["-y", "mcp-memory-libsql"],
+        "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
+    }
 
 
 def researcher_mcp_server_params(name: str):
-    return [
-        {"command": "uvx", "args": ["mcp-server-fetch"]},
-        {
-            "command": "npx",
-            "args": ["-y", "@modelcontextprotocol/server-brave-search"],
-            "env": brave_env,
-        },
-        {
-            "command": "npx",
-            "args": ["-y", "mcp-memory-libsql"],
-            "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
-        },
-    ]
+    return researcher_shared_mcp_server_params + [memory_mcp_server_params(name)]
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from agents.mcp import MCPServerStdio
+from mcp_params import (
+    accounts_mcp,
+    market_mcp,
+    trader_mcp_server_params,
+    researcher_shared_mcp_server_params,
+    memory_mcp_server_params,
+)
+
+CLIENT_SESSION_TIMEOUT_SECONDS = 120
+HEALTH_CHECK_TIMEOUT_SECONDS = 10
+
+
+class PooledServer:
+    """
+    An MCP server session owned by its own background task.
+
+    The stdio transport's cancel scopes must be exited by the task that entered them, in order,
+    so each server is connected and cleaned up inside a dedicated task; any other task can use its session.
+    """
+
+    def __init__(self, key: str, params: dict):
+        self.key = key
+        self.server = MCPServerStdio(
+            params,
+            client_session_timeout_seconds=CLIENT_SESSION_TIMEOUT_SECONDS,
+            cache_tools_list=True,
+        )
+        self._connected = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._error: Exception | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        try:
+            await self.server.connect()
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._connected.set()
+        await self._stopping.wait()
+        try:
+            await self.server.cleanup()
+        except Exception as e:
+            print(f"Error stopping MCP server {self.key}: {e}")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"mcp-{self.key}")
+        await self._connected.wait()
+        if self._error:
+            raise self._error
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            await self._task
+
+    async def is_healthy(self) -> bool:
+        if self._task is None or self._task.done() or self.server.session is None:
+            return False
+        try:
+            await asyncio.wait_for(self.server.session.send_ping(), timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+
+class MCPServerPool:
+    """
+    Long-lived MCP server sessions for the trading floor, started once and reused every cycle.
+
+    The accounts, push and market servers, and the researcher's fetch and search servers, are shared by
+    all traders; each trader has its own memory server so that knowledge graphs stay isolated.
+    """
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        self.servers: dict[str, PooledServer] = {}
+        self.params: dict[str, dict] = {}
+        self.accounts_key = None
+        self.market_key = None
+        for index, params in enumerate(trader_mcp_server_params):
+            self.params[f"trader-{index}"] = params
+            if params is accounts_mcp:
+                self.accounts_key = f"trader-{index}"
+            if params is market_mcp:
+                self.market_key = f"trader-{index}"
+        for index, params in enumerate(researcher_shared_mcp_server_params):
+            self.params[f"researcher-{index}"] = params
+        for name in names:
+            self.params[f"memory-{name}"] = memory_mcp_server_params(name)
+        self.restarts = 0
+        self.last_startup_seconds = 0.0
+        self.last_health_check_seconds = 0.0
+        # One check at a time per server, so traders finding the same dead server restart it only once
+        self._checking: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def _start(self, key: str) -> None:
+        server = PooledServer(key, self.params[key])
+        await server.start()
+        self.servers[key] = server
+
+    async def _restart(self, key: str) -> None:
+        server = self.servers.pop(key, None)
+        if server:
+            print(f"MCP server {key} is not responding; restarting it")
+            self.restarts += 1
+            await server.stop()
+        await self._start(key)
+
+    async def start(self) -> None:
+        """Start every server that isn't already running, concurrently"""
+        started = time.monotonic()
+        await asyncio.gather(*[self._start(key) for key in self.params if key not in self.servers])
+        self.last_startup_seconds = time.monotonic() - started
+
+    async def _check(self, key: str) -> None:
+        async with self._checking[key]:
+            server = self.servers.get(key)
+            if not server or not await server.is_healthy():
+                await self._restart(key)
+
+    async def check_health(self) -> None:
+        """Ping every server, restarting any that have crashed or stopped responding"""
+        started = time.monotonic()
+        await asyncio.gather(*[self._check(key) for key in self.params])
+        self.last_health_check_seconds = time.monotonic() - started
+
+    async def check_trader_servers(self, name: str) -> None:
+        """Ping just the servers a trader is about to use, restarting any that have died since the last check"""
+        keys = [key for key in self.params if not key.startswith("memory-") or key == f"memory-{name}"]
+        await asyncio.gather(*[self._check(key) for key in keys])
+
+    async def close(self) -> None:
+        await asyncio.gather(*[server.stop() for server in self.servers.values()])
+        self.servers.clear()
+
+    def trader_servers(self) -> list[MCPServerStdio]:
+        return [self.servers[f"trader-{index}"].server for index in range(len(trader_mcp_server_params))]
+
+    def researcher_servers(self, name: str) -> list[MCPServerStdio]:
+        shared = [
+            self.servers[f"researcher-{index}"].server
+            for index in range(len(researcher_shared_mcp_server_params))
+        ]
+        return shared + [self.servers[f"memory-{name}"].server]
+
+    async def read_resource(self, key: str, uri: str) -> str:
+        result = await self.servers[key].server.session.read_resource(uri)
+        return result.contents[0].text
+
+    async def read_accounts_resource(self, uri: str) -> str:
+        """Read a resource from the pooled accounts server instead of launching another one"""
+        return await self.read_resource(self.accounts_key, uri)
+
+    async def read_market_cache_stats(self) -> dict | None:
+        """
+        The market data cache counters from the pooled market server, which is where the traders' price
+        lookups are cached; None if the market server is Polygon's, which doesn't serve them
+        """
+        if "market_server.py" not in self.params[self.market_key].get("args", []):
+            return None
+        return json.loads(await self.read_resource(self.market_key, "market://cache_stats"))
@@ -0,0 +1,27 @@
+"""
+Convert accounts.db files from the original schema, with one JSON blob per account,
+to the normalized accounts / transactions / portfolio_values tables.
+A copy of each file is kept alongside it as <file>.bak before it is converted.
+
+Usage: uv run migrate.py [path ...]   (defaults to accounts.db)
+"""
+
+import sys
+import sqlite3
+from database import DB, migrate_legacy_accounts
+
+
+def migrate(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        with sqlite3.connect(f"{path}.bak") as backup:
+            conn.backup(backup)
+        return migrate_legacy_accounts(conn)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or [DB]:
+        count = migrate(path)
+        if count:
+            print(f"{path}: migrated {count} accounts")
+        else:
+            print(f"{path}: already up to date")
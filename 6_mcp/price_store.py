@@ -0,0 +1,209 @@
+"""
+A columnar store for daily market data: one NumPy array per date, memory-mapped on read.
+
+Each date's file holds a row per symbol with open, high, low, close and volume columns, NaN where there is
+no data. Row numbers come from a single symbol index shared by every date, symbols.txt, which is only ever
+appended to, so a symbol keeps its row for good. Looking up one price is a dict lookup and an array read,
+without parsing the rest of the day's ~10k tickers. A range scan stacks one field of every day's map into a
+single array, cached until a day in the range changes, so each symbol's history is then one column of it.
+
+Usage: uv run price_store.py   (imports the existing rows of the market table)
+"""
+
+import os
+import threading
+import numpy as np
+from functools import lru_cache
+from dotenv import load_dotenv
+from database import read_market_history
+
+load_dotenv(override=True)
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "prices")
+FIELDS = ["open", "high", "low", "close", "volume"]
+CLOSE = FIELDS.index("close")
+
+
+@lru_cache(maxsize=512)
+def _load_day(path: str, mtime: float) -> np.ndarray:
+    # Keyed on the modification time too, so a day that's re-ingested is mapped afresh
+    return np.load(path, mmap_mode="r")
+
+
+@lru_cache(maxsize=4)
+def _stack(files: tuple[tuple[str, float], ...], column: int) -> np.ndarray:
+    # Keyed on every day's path and modification time, so adding or re-ingesting a day builds it afresh
+    days = [_load_day(path, mtime) for path, mtime in files]
+    stacked = np.full((len(days), max((len(data) for data in days), default=0)), np.nan)
+    for i, data in enumerate(days):
+        stacked[i, : len(data)] = data[:, column]
+    return stacked
+
+
+class DayPrices:
+    """One date's prices; behaves like the dict of closes that the market table used to hold"""
+
+    def __init__(self, store: "PriceStore", data: np.ndarray):
+        self.store = store
+        self.data = data
+
+    def row(self, symbol: str) -> int | None:
+        row = self.store.row(symbol)
+        return row if row is not None and row < len(self.data) else None
+
+    def get(self, symbol: str, default=None, field: str = "close"):
+        row = self.row(symbol)
+        if row is None:
+            return default
+        value = self.data[row, FIELDS.index(field)]
+        return default if np.isnan(value) else float(value)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.get(symbol) is not None
+
+    def closes(self) -> dict[str, float]:
+        """Every symbol with a close on this date"""
+        symbols = self.store.symbols_for(len(self.data))
+        column = np.asarray(self.data[: len(symbols), CLOSE])
+        present = np.flatnonzero(~np.isnan(column))
+        return {symbols[row]: float(column[row]) for row in present}
+
+
+class PriceStore:
+    def __init__(self, directory: str = PRICE_STORE_DIR):
+        self.directory = directory
+        self.symbols: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._index_size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "symbols.txt")
+
+    def _path(self, date: str) -> str:
+        return os.path.join(self.directory, f"{date}.npy")
+
+    def _refresh_index(self) -> None:
+        """Pick up symbols appended by this or another process since the index was last read"""
+        try:
+            size = os.path.getsize(self._index_path)
+        except FileNotFoundError:
+            return
+        if size == self._index_size:
+            return
+        with open(self._index_path) as f:
+            f.seek(self._index_size)
+            added = f.read()
+        # Only consume whole lines, in case another process is mid-append
+        complete = added[: added.rfind("\n") + 1]
+        for symbol in complete.splitlines():
+            # Two processes may append the same new symbol; the first occurrence is its row
+            self.symbols.append(symbol)
+            self._rows.setdefault(symbol, len(self.symbols) - 1)
+        self._index_size += len(complete.encode())
+
+    def row(self, symbol: str) -> int | None:
+        row = self._rows.get(symbol)
+        if row is None:
+            with self._lock:
+                self._refresh_index()
+            row = self._rows.get(symbol)
+        return row
+
+    def symbols_for(self, rows: int) -> list[str]:
+        """The symbols of the first rows of a date's array"""
+        if len(self.symbols) < rows:
+            with self._lock:
+                self._refresh_index()
+        return self.symbols[:rows]
+
+    def dates(self, start: str = "", end: str = "9999-12-31") -> list[str]:
+        names = [name[:-4] for name in os.listdir(self.directory) if name.endswith(".npy")]
+        return sorted(date for date in names if start <= date <= end)
+
+    def _files(self, start: str, end: str) -> list[tuple[str, str, float]]:
+        """(date, path, modification time) for each date from start to end, from one scan of the directory"""
+        with os.scandir(self.directory) as entries:
+            files = [
+                (entry.name[:-4], entry.path, entry.stat().st_mtime)
+                for entry in entries
+                if entry.name.endswith(".npy") and start <= entry.name[:-4] <= end
+            ]
+        return sorted(files)
+
+    def has(self, date: str) -> bool:
+        return os.path.exists(self._path(date))
+
+    def day(self, date: str) -> DayPrices | None:
+        path = self._path(date)
+        try:
+            return DayPrices(self, _load_day(path, os.path.getmtime(path)))
+        except FileNotFoundError:
+            return None
+
+    def price(self, date: str, symbol: str, field: str = "close") -> float | None:
+        day = self.day(date)
+        return day.get(symbol, field=field) if day else None
+
+    def range(self, start: str, end: str, field: str = "close") -> tuple[list[str], np.ndarray]:
+        """The dates from start to end, and one field for every symbol on each as a (dates, rows) array"""
+        files = self._files(start, end)
+        stacked = _stack(tuple((path, mtime) for _, path, mtime in files), FIELDS.index(field))
+        return [date for date, _, _ in files], stacked
+
+    def history(self, symbol: str, start: str, end: str, field: str = "close") -> tuple[list[str], np.ndarray]:
+        """The dates from start to end and one symbol's values on each, NaN where it has none"""
+        dates, stacked = self.range(start, end, field)
+        row = self.row(symbol)
+        if row is None or row >= stacked.shape[1]:
+            return dates, np.full(len(dates), np.nan)
+        return dates, stacked[:, row]
+
+    def ingest(self, date: str, rows: dict[str, tuple]) -> None:
+        """Write a date's (open, high, low, close, volume) per symbol, replacing any existing file for the date"""
+        with self._lock:
+            self._refresh_index()
+            new = [symbol for symbol in rows if symbol not in self._rows]
+            if new:
+                # One append, so concurrent writers interleave whole blocks of lines, never partial ones
+                with open(self._index_path, "a") as f:
+                    f.write("".join(f"{symbol}\n" for symbol in new))
+                self._refresh_index()
+            data = np.full((len(self.symbols), len(FIELDS)), np.nan)
+            for symbol, values in rows.items():
+                data[self._rows[symbol]] = [np.nan if value is None else value for value in values]
+        temporary = f"{self._path(date)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, data)
+        os.replace(temporary, self._path(date))
+
+    def ingest_closes(self, date: str, closes: dict[str, float]) -> None:
+        nan = float("nan")
+        self.ingest(date, {symbol: (nan, nan, nan, close, nan) for symbol, close in closes.items()})
+
+    def ingest_grouped_daily(self, date: str, results) -> None:
+        """Bulk ingest the aggregates from polygon's grouped daily endpoint"""
+        self.ingest(
+            date,
+            {
+                result.ticker: (result.open, result.high, result.low, result.close, result.volume)
+                for result in results
+            },
+        )
+
+    def import_market_table(self) -> int:
+        """Copy in every date from the market table of accounts.db that isn't in the store yet"""
+        imported = 0
+        for date, closes in read_market_history("0000-00-00", "9999-12-31"):
+            if not self.has(date):
+                self.ingest_closes(date, closes)
+                imported += 1
+        return imported
+
+
+@lru_cache(maxsize=1)
+def get_price_store() -> PriceStore:
+    return PriceStore()
+
+
+if __name__ == "__main__":
+    print(f"Imported {get_price_store().import_market_table()} dates into {PRICE_STORE_DIR}")
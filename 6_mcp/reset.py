@@ -1,4 +1,5 @@
 from accounts import Account
+from trading_floor import trader_config
 
 waren_strategy = """
 You are Warren, and you are named in homage to your role model, Warren Buffett.
@@ -39,11 +40,19 @@ You focus your trading on crypto ETFs.
 """
 
 
+strategies = {
+    "Warren": waren_strategy,
+    "George": george_strategy,
+    "Ray": ray_strategy,
+    "Cathie": cathie_strategy,
+}
+
+
 def reset_traders():
-    Account.get("Warren").reset(waren_strategy)
-    Account.get("George").reset(george_strategy)
-    Account.get("Ray").reset(ray_strategy)
-    Account.get("Cathie").reset(cathie_strategy)
+    """Reset every configured trader, with the strategy from the config or, for the originals, from above"""
+    for trader in trader_config:
+        strategy = trader.get("strategy") or strategies.get(trader["name"], "")
+        Account.get(trader["name"]).reset(strategy)
 
 
 if __name__ == "__main__":
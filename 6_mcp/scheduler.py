@@ -0,0 +1,123 @@
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from dotenv import load_dotenv
+from market import is_market_open
+from mcp_pool import MCPServerPool
+from traders import Trader, get_provider
+
+load_dotenv(override=True)
+
+# How many traders may run at once against each provider, e.g. "openai=4,deepseek=2,gemini=1";
+# providers not listed get DEFAULT_PROVIDER_CONCURRENCY
+
+DEFAULT_PROVIDER_CONCURRENCY = int(os.getenv("DEFAULT_PROVIDER_CONCURRENCY", "4"))
+PROVIDER_CONCURRENCY = os.getenv("PROVIDER_CONCURRENCY", "")
+
+# Each run starts up to this many seconds after its slot, so traders on the same cadence don't align exactly
+SCHEDULE_JITTER_SECONDS = float(os.getenv("SCHEDULE_JITTER_SECONDS", "30"))
+
+
+def parse_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            provider, limit = item.split("=", 1)
+            limits[provider.strip().lower()] = int(limit)
+    return limits
+
+
+def next_slot(start: float, period: float, offset: float, now: float) -> float:
+    """The first slot at or after now on the grid start + offset + k * period"""
+    first = start + offset
+    if now <= first:
+        return first
+    return first + -(-(now - first) // period) * period
+
+
+class Scheduler:
+    """
+    Runs each trader on its own fixed wall-clock grid, rather than sleeping for a fixed time after a batch.
+
+    Traders are spread evenly across their period so that MCP calls, API requests and database writes
+    don't all land at once, and each run is jittered a little further. A run that overruns its period
+    skips the slots it missed instead of running them back to back, so a slow cycle never causes drift.
+    Concurrent runs are capped per model provider.
+    """
+
+    def __init__(
+        self,
+        traders: list[Trader],
+        pool: MCPServerPool,
+        cadences: dict[str, float],
+        housekeeping=None,
+        housekeeping_minutes: float = 60,
+        run_when_closed: bool = False,
+        jitter_seconds: float = SCHEDULE_JITTER_SECONDS,
+        limits: dict[str, int] | None = None,
+    ):
+        self.traders = traders
+        self.pool = pool
+        self.cadences = cadences
+        self.housekeeping = housekeeping
+        self.housekeeping_minutes = housekeeping_minutes
+        self.run_when_closed = run_when_closed
+        self.jitter_seconds = jitter_seconds
+        limits = parse_limits(PROVIDER_CONCURRENCY) if limits is None else limits
+        self.limits = defaultdict(lambda: asyncio.Semaphore(DEFAULT_PROVIDER_CONCURRENCY))
+        for provider, limit in limits.items():
+            self.limits[provider] = asyncio.Semaphore(limit)
+        self.start = time.time()
+        self.runs = 0
+        self.skipped_slots = 0
+
+    async def _sleep_until(self, when: float) -> None:
+        await asyncio.sleep(max(when - time.time(), 0))
+
+    async def _run_trader(self, trader: Trader, offset: float) -> None:
+        period = self.cadences[trader.name] * 60
+        limit = self.limits[get_provider(trader.model_name)]
+        slot = self.start + offset
+        while True:
+            await self._sleep_until(slot + random.uniform(0, self.jitter_seconds))
+            if self.run_when_closed or await asyncio.to_thread(is_market_open):
+                async with limit:
+                    try:
+                        # A shared server that died since housekeeping would otherwise fail this whole run
+                        await self.pool.check_trader_servers(trader.name)
+                    except Exception as e:
+                        print(f"Error checking MCP servers for {trader.name}: {e}")
+                    await trader.run(self.pool)
+                self.runs += 1
+            else:
+                print(f"Market is closed, skipping run for {trader.name}")
+            following = max(next_slot(self.start, period, offset, time.time()), slot + period)
+            missed = round((following - slot) / period) - 1
+            if missed > 0:
+                print(f"{trader.name} overran its {period / 60:g} minute slot; skipping {missed} run(s)")
+                self.skipped_slots += missed
+            slot = following
+
+    async def _run_housekeeping(self) -> None:
+        period = self.housekeeping_minutes * 60
+        slot = self.start
+        while True:
+            await self._sleep_until(slot)
+            try:
+                await self.housekeeping()
+            except Exception as e:
+                print(f"Error in housekeeping: {e}")
+            slot = max(next_slot(self.start, period, 0, time.time()), slot + period)
+
+    async def run(self) -> None:
+        """Run every trader, and the housekeeping job if there is one, until cancelled"""
+        count = len(self.traders)
+        tasks = [
+            self._run_trader(trader, index * self.cadences[trader.name] * 60 / count)
+            for index, trader in enumerate(self.traders)
+        ]
+        if self.housekeeping:
+            tasks.append(self._run_housekeeping())
+        await asyncio.gather(*tasks)
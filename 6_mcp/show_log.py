@@ -0,0 +1,39 @@
+"""
+Print a trader's log: every entry from one of its cycles, by default the latest, or every entry from a day
+that archive_logs() has already moved out of the logs table into logs_archive.
+
+Usage: uv run show_log.py <name> [cycle]
+       uv run show_log.py <name> --day YYYY-MM-DD
+"""
+
+import sys
+from database import read_cycle_log, read_latest_cycle, read_archived_log
+
+
+def show_cycle(name: str, cycle: int | None = None) -> int:
+    cycle = cycle or read_latest_cycle(name)
+    entries = read_cycle_log(name, cycle)
+    for when, type, message, mode in entries:
+        print(f"{when} [{mode or '-'}] {type}: {message}")
+    return len(entries)
+
+
+def show_day(name: str, day: str) -> int:
+    entries = read_archived_log(name, day)
+    for when, type, message in entries:
+        print(f"{when} {type}: {message}")
+    return len(entries)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    name = sys.argv[1]
+    if "--day" in sys.argv:
+        day = sys.argv[sys.argv.index("--day") + 1]
+        if not show_day(name, day):
+            print(f"No archived log for {name} on {day}")
+    else:
+        cycle = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        if not show_cycle(name, cycle):
+            print(f"No log entries for {name} in cycle {cycle or 'latest'}")
@@ -1,12 +1,11 @@
-from datetime import datetime
-from market import is_paid_polygon, is_realtime_polygon
+from market import is_paid_polygon, is_realtime_polygon, now
 
 if is_realtime_polygon:
     note = "You have access to realtime market data tools; use your get_last_trade tool for the latest trade price. You can also use tools for share information, trends and technical indicators and fundamentals."
 elif is_paid_polygon:
     note = "You have access to market data tools but without access to the trade or quote tools; use your get_snapshot_ticker tool to get the latest share price on a 15 min delay. You can also use tools for share information, trends and technical indicators and fundamentals."
 else:
-    note = "You have access to end of day market data; use you get_share_price tool to get the share price as of the prior close."
+    note = "You have access to end of day market data; use you get_share_price tool to get the share price as of the prior close, or lookup_share_prices to price several symbols in one call."
 
 
 def researcher_instructions():
@@ -24,7 +23,7 @@ Also use it to store web addresses that you find interesting so you can check th
 Draw on your knowledge graph to build your expertise over time.
 
 If there isn't a specific request, then just respond with investment opportunities based on searching latest news.
-The current datetime is {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+The current datetime is {now().strftime("%Y-%m-%d %H:%M:%S")}
 """
 
 def research_tool():
@@ -47,6 +46,16 @@ After you've completed trading, send a push notification with a brief summary of
 Your goal is to maximize your profits according to your strategy.
 """
 
+def backtest_instructions(name: str):
+    return f"""
+You are {name}, a trader on the stock market. Your account is under your name, {name}.
+You actively manage your portfolio according to your strategy.
+This is a historical simulation: you have tools to look up share prices as of the prior close,
+and to buy and sell stocks using your account name {name}, but no research, memory or notification tools.
+Use these tools to make decisions and execute trades, then reply with a 2-3 sentence appraisal.
+Your goal is to maximize your profits according to your strategy.
+"""
+
 def trade_message(name, strategy, account):
     return f"""Based on your investment strategy, you should now look for new opportunities.
 Use the research tool to find news and opportunities consistent with your strategy.
@@ -61,7 +70,7 @@ Your investment strategy:
 Here is your current account:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
 respond with a brief 2-3 sentence appraisal of your portfolio and its outlook.
@@ -80,7 +89,40 @@ You also have a tool to change your strategy if you wish; you can decide at any
 Here is your current account:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
-respond with a brief 2-3 sentence appraisal of your portfolio and its outlook."""
\ No newline at end of file
+respond with a brief 2-3 sentence appraisal of your portfolio and its outlook."""
+
+def backtest_trade_message(name, strategy, account):
+    return f"""Based on your investment strategy, you should now look for new opportunities.
+Use your get_share_price tool to look up prices as of the prior close.
+Finally, make your decision, then execute trades using the tools.
+Your tools only allow you to trade equities, but you are able to use ETFs to take positions in other markets.
+You do not need to rebalance your portfolio; you will be asked to do so later.
+Just make trades based on your strategy as needed.
+Your investment strategy:
+{strategy}
+Here is your current account:
+{account}
+Here is the current datetime:
+{now().strftime("%Y-%m-%d %H:%M:%S")}
+Now, make your decision and execute trades. Your account name is {name}.
+After you've executed your trades, respond with a brief 2-3 sentence appraisal of your portfolio and its outlook.
+"""
+
+def backtest_rebalance_message(name, strategy, account):
+    return f"""Based on your investment strategy, you should now examine your portfolio and decide if you need to rebalance.
+Use your get_share_price tool to look up prices as of the prior close for your existing holdings.
+Finally, make your decision, then execute trades using the tools as needed.
+You do not need to identify new investment opportunities at this time; you will be asked to do so later.
+Just rebalance your portfolio based on your strategy as needed.
+Your investment strategy:
+{strategy}
+You also have a tool to change your strategy if you wish; you can decide at any time that you would like to evolve or even switch your strategy.
+Here is your current account:
+{account}
+Here is the current datetime:
+{now().strftime("%Y-%m-%d %H:%M:%S")}
+Now, make your decision and execute trades. Your account name is {name}.
+After you've executed your trades, respond with a brief 2-3 sentence appraisal of your portfolio and its outlook."""
@@ -1,44 +1,154 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_logs, log_timestamp, write_metrics, read_cycle_metrics, read_span_metrics
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import numpy as np
+import queue
 import secrets
-import string
+import threading
+import time
 
-ALPHANUM = string.ascii_lowercase + string.digits 
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_SECONDS = 1.0
+
+# Upper bounds, in milliseconds, of the buckets in latency_histograms()
+LATENCY_BUCKETS_MS = [10, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 30_000, 60_000]
+
+# How much of a trace id the tag may take, so there is always plenty of randomness after it
+MAX_TAG_LENGTH = 16
+
+_FLUSH = object()
 
 def make_trace_id(tag: str) -> str:
     """
     Return a string of the form 'trace_<tag><random>',
     where the total length after 'trace_' is 32 chars.
+    The tag only makes traces easier to spot on the dashboard; use register_trace to attach a trader to one.
+    """
+    tag = "".join(c for c in tag.lower() if c.isalnum())[:MAX_TAG_LENGTH]
+    return f"trace_{tag}{secrets.token_hex(16)[len(tag):]}"
+
+class TraceContext(NamedTuple):
+    name: str
+    cycle: int
+    mode: str
+
+_trace_contexts: dict[str, TraceContext] = {}
+
+def register_trace(trace_id: str, name: str, cycle: int, mode: str) -> None:
+    """Record which trader, cycle and mode (trade or rebalance) a trace belongs to, before the trace starts"""
+    _trace_contexts[trace_id] = TraceContext(name.lower(), cycle, mode)
+
+def unregister_trace(trace_id: str) -> None:
+    """Forget a trace once it has ended"""
+    _trace_contexts.pop(trace_id, None)
+
+def get_trace_context(trace_or_span: Trace | Span) -> TraceContext | None:
+    """The trader run a trace or span belongs to, or None if it isn't part of one"""
+    return _trace_contexts.get(trace_or_span.trace_id)
+
+def get_trader_name(trace_or_span: Trace | Span) -> str | None:
+    context = _trace_contexts.get(trace_or_span.trace_id)
+    return context.name if context else None
+
+class BatchWriter:
     """
-    tag += "0"
-    pad_len = 32 - len(tag)
-    random_suffix = ''.join(secrets.choice(ALPHANUM) for _ in range(pad_len))
-    return f"trace_{tag}{random_suffix}"
+    Writes queued items from a background thread, so tracing never blocks the event loop: a batch is
+    written whenever batch_size items are waiting or flush_seconds have passed since the first arrived.
+    """
+
+    def __init__(self, write, name: str, batch_size: int = LOG_BATCH_SIZE, flush_seconds: float = LOG_FLUSH_SECONDS):
+        self.write = write
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._run, name=name, daemon=True)
+        self._writer.start()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def put(self, item) -> None:
+        self._queue.put(item)
+
+    def _next_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _FLUSH:
+                self._queue.task_done()
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.write(batch)
+        except Exception as e:
+            print(f"{self.name} was not able to write {len(batch)} entries due to {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self) -> None:
+        """Block until every queued item has been written"""
+        if self._writer.is_alive():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        """Write everything still queued, then stop the writer thread"""
+        self._stopped.set()
+        self._queue.put(_FLUSH)
+        self._writer.join()
 
 class LogTracer(TracingProcessor):
+    """
+    Records traces and spans in the logs table without blocking the event loop:
+    entries are queued in memory and a background thread writes them in batches,
+    whenever LOG_BATCH_SIZE entries are waiting or LOG_FLUSH_SECONDS have passed.
+    """
 
-    def get_name(self, trace_or_span: Trace | Span) -> str | None:
-        trace_id = trace_or_span.trace_id
-        name = trace_id.split("_")[1]
-        if '0' in name:
-            return name.split("0")[0]
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE, flush_seconds: float = LOG_FLUSH_SECONDS):
+        self._writer = BatchWriter(write_logs, "LogTracerWriter", batch_size, flush_seconds)
+
+    def _log(self, context: TraceContext, trace_id: str, type: str, message: str) -> None:
+        entry = (context.name, log_timestamp(), type, message, trace_id, context.cycle, context.mode)
+        if self._writer.stopped:
+            write_logs([entry])
         else:
-            return None
+            self._writer.put(entry)
+
+    def get_name(self, trace_or_span: Trace | Span) -> str | None:
+        return get_trader_name(trace_or_span)
 
     def on_trace_start(self, trace) -> None:
-        name = self.get_name(trace)
-        if name:
-            write_log(name, "trace", f"Started: {trace.name}")
+        context = get_trace_context(trace)
+        if context:
+            self._log(context, trace.trace_id, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
-        name = self.get_name(trace)
-        if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+        context = get_trace_context(trace)
+        if context:
+            self._log(context, trace.trace_id, "trace", f"Ended: {trace.name}")
 
     def on_span_start(self, span) -> None:
-        name = self.get_name(span)
+        context = get_trace_context(span)
         type = span.span_data.type if span.span_data else "span"
-        if name:
+        if context:
             message = "Started"
             if span.span_data:
                 if span.span_data.type:
@@ -49,16 +159,16 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self._log(context, span.trace_id, type, message)
 
     def on_span_end(self, span) -> None:
-        name = self.get_name(span)
+        context = get_trace_context(span)
         type = span.span_data.type if span.span_data else "span"
-        if name:
+        if context:
             message = "Ended"
             if span.span_data:
                 if span.span_data.type:
-                    
+
                     message += f" {span.span_data.type}"
                 if hasattr(span.span_data, "name") and span.span_data.name:
                     message += f" {span.span_data.name}"
@@ -66,10 +176,151 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self._log(context, span.trace_id, type, message)
 
     def force_flush(self) -> None:
+        """Block until every queued entry has been written"""
+        self._writer.flush()
+
+    def shutdown(self) -> None:
+        """Write everything still queued, then stop the writer thread"""
+        self._writer.shutdown()
+
+def _span_details(span_data) -> tuple[str | None, str | None, int | None, int | None]:
+    """The label, MCP server and token counts worth recording for a span"""
+    label = getattr(span_data, "name", None) or getattr(span_data, "model", None)
+    server = getattr(span_data, "server", None) or (getattr(span_data, "mcp_data", None) or {}).get("server")
+    input_tokens = output_tokens = None
+    usage = getattr(span_data, "usage", None)
+    response = getattr(span_data, "response", None)
+    if usage:
+        input_tokens, output_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    elif response is not None and response.usage:
+        label = label or response.model
+        input_tokens, output_tokens = response.usage.input_tokens, response.usage.output_tokens
+    return label, server, input_tokens, output_tokens
+
+class MetricsTracer(TracingProcessor):
+    """
+    Records the timing of every trace and span in the metrics table, in batches from a background thread:
+    one row per span with its kind (trace, agent, generation, response, function, mcp_tools), its model,
+    tool or agent name, the MCP server for tool calls and listings, and token counts for model calls.
+    Each trader run is one trace, so a trace's rows make up one cycle.
+    """
+
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE, flush_seconds: float = LOG_FLUSH_SECONDS):
+        self._writer = BatchWriter(write_metrics, "MetricsTracerWriter", batch_size, flush_seconds)
+        self._trace_starts: dict[str, tuple[str, float]] = {}
+
+    def _record(self, row: dict) -> None:
+        if self._writer.stopped:
+            write_metrics([row])
+        else:
+            self._writer.put(row)
+
+    def on_trace_start(self, trace) -> None:
+        if get_trader_name(trace):
+            self._trace_starts[trace.trace_id] = (datetime.now(timezone.utc).isoformat(), time.perf_counter())
+
+    def on_trace_end(self, trace) -> None:
+        name = get_trader_name(trace)
+        started = self._trace_starts.pop(trace.trace_id, None)
+        if name and started:
+            self._record({
+                "name": name,
+                "trace_id": trace.trace_id,
+                "kind": "trace",
+                "label": trace.name,
+                "started": started[0],
+                "duration_ms": (time.perf_counter() - started[1]) * 1000,
+            })
+
+    def on_span_start(self, span) -> None:
         pass
 
+    def on_span_end(self, span) -> None:
+        name = get_trader_name(span)
+        if not name or not span.started_at or not span.ended_at:
+            return
+        started, ended = datetime.fromisoformat(span.started_at), datetime.fromisoformat(span.ended_at)
+        label, server, input_tokens, output_tokens = _span_details(span.span_data)
+        self._record({
+            "name": name,
+            "trace_id": span.trace_id,
+            "kind": span.span_data.type if span.span_data else "span",
+            "label": label,
+            "server": server,
+            "started": started.isoformat(),
+            "duration_ms": (ended - started).total_seconds() * 1000,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "error": span.error.get("message") if span.error else None,
+        })
+
+    def force_flush(self) -> None:
+        self._writer.flush()
+
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        self._writer.shutdown()
+
+def _percentiles(durations: list[float]) -> tuple[float | None, float | None]:
+    if not durations:
+        return None, None
+    p50, p95 = np.percentile(durations, [50, 95])
+    return float(p50), float(p95)
+
+def cycle_metrics(name: str, last_n: int = 5) -> list[dict]:
+    """
+    Summarize a trader's most recent cycles, newest first: when each started, how long it took, p50 and p95
+    latency of its model calls and of its tool calls, and the tokens it used.
+    """
+    cycles: dict[str, dict] = {}
+    for row in read_cycle_metrics(name, last_n):
+        cycle = cycles.setdefault(row["trace_id"], {"model": [], "tool": [], "tokens": 0})
+        if row["kind"] == "trace":
+            cycle["started"], cycle["duration_ms"] = row["started"], row["duration_ms"]
+        elif row["kind"] in ("generation", "response"):
+            cycle["model"].append(row["duration_ms"])
+            cycle["tokens"] += (row["input_tokens"] or 0) + (row["output_tokens"] or 0)
+        elif row["kind"] == "function":
+            cycle["tool"].append(row["duration_ms"])
+    summaries = []
+    for cycle in cycles.values():
+        if "started" not in cycle:
+            continue
+        model_p50, model_p95 = _percentiles(cycle["model"])
+        tool_p50, tool_p95 = _percentiles(cycle["tool"])
+        summaries.append({
+            "started": cycle["started"],
+            "duration_ms": cycle["duration_ms"],
+            "model_calls": len(cycle["model"]),
+            "model_p50_ms": model_p50,
+            "model_p95_ms": model_p95,
+            "tool_calls": len(cycle["tool"]),
+            "tool_p50_ms": tool_p50,
+            "tool_p95_ms": tool_p95,
+            "tokens": cycle["tokens"],
+        })
+    return sorted(summaries, key=lambda summary: summary["started"], reverse=True)
+
+def latency_histograms(hours: float = 24) -> dict[tuple, dict]:
+    """
+    Latency of every kind of span over the last few hours, keyed by (kind, label, server), with the count,
+    p50, p95 and max in milliseconds, and the number of spans in each of the LATENCY_BUCKETS_MS.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    durations: dict[tuple, list[float]] = {}
+    for kind, label, server, duration_ms in read_span_metrics(since):
+        durations.setdefault((kind, label, server), []).append(duration_ms)
+    histograms = {}
+    for key, values in durations.items():
+        p50, p95 = _percentiles(values)
+        counts = np.bincount(np.searchsorted(LATENCY_BUCKETS_MS, values), minlength=len(LATENCY_BUCKETS_MS) + 1)
+        histograms[key] = {
+            "count": len(values),
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "max_ms": max(values),
+            "buckets": dict(zip([f"<={bound}" for bound in LATENCY_BUCKETS_MS] + ["more"], counts.tolist())),
+        }
+    return histograms
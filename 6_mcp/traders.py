@@ -1,11 +1,22 @@
 from contextlib import AsyncExitStack
 from accounts_client import read_accounts_resource, read_strategy_resource
-from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
+from accounts_local import (
+    get_accounts_tools_local,
+    read_accounts_resource_local,
+    read_strategy_resource_local,
+)
+from tracers import make_trace_id, register_trace, unregister_trace
+from database import read_latest_cycle
+from llm_cache import LLM_CACHE_MODE, cached_http_client
+from rate_limiter import rate_limited
+from agents import Agent, Tool, Runner, RunContextWrapper, OpenAIChatCompletionsModel, OpenAIResponsesModel, trace
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
 import json
+import time
+import asyncio
+from functools import lru_cache
 from agents.mcp import MCPServerStdio
 from templates import (
     researcher_instructions,
@@ -14,10 +25,12 @@ from templates import (
     rebalance_message,
     research_tool,
 )
-from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from mcp_params import trader_mcp_server_params, researcher_mcp_server_params, use_local_accounts
+from mcp_pool import MCPServerPool
 
 load_dotenv(override=True)
 
+openai_api_key = os.getenv("OPENAI_API_KEY")
 deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
 google_api_key = os.getenv("GOOGLE_API_KEY")
 grok_api_key = os.getenv("GROK_API_KEY")
@@ -28,25 +41,49 @@ GROK_BASE_URL = "https://api.x.ai/v1"
 GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+PROVIDER_ENDPOINTS = {
+    "openrouter": (OPENROUTER_BASE_URL, openrouter_api_key),
+    "deepseek": (DEEPSEEK_BASE_URL, deepseek_api_key),
+    "grok": (GROK_BASE_URL, grok_api_key),
+    "gemini": (GEMINI_BASE_URL, google_api_key),
+}
+
 MAX_TURNS = 30
 
-openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter_api_key)
-deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
-grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
-gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
 
+@lru_cache(maxsize=None)
+def get_client(base_url: str | None, api_key: str | None) -> AsyncOpenAI:
+    """One client per provider, created on first use, so a run that never calls a provider doesn't need its key"""
+    if LLM_CACHE_MODE == "replay":
+        # Replays never reach the provider, so they don't need a real key
+        api_key = api_key or "replay"
+    # No retries in the SDK: rate_limiter backs off 429s itself, and needs to see each one to slow everyone down
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=cached_http_client(), max_retries=0)
 
-def get_model(model_name: str):
+
+def get_provider(model_name: str) -> str:
+    """The provider that serves a model, by the same naming rules get_model uses"""
     if "/" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
+        return "openrouter"
     elif "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        return "deepseek"
     elif "grok" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client)
+        return "grok"
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        return "gemini"
     else:
-        return model_name
+        return "openai"
+
+
+def get_model(model_name: str):
+    """The model for a name, behind the shared rate limiter for its provider"""
+    provider = get_provider(model_name)
+    if provider in PROVIDER_ENDPOINTS:
+        base_url, api_key = PROVIDER_ENDPOINTS[provider]
+        model = OpenAIChatCompletionsModel(model=model_name, openai_client=get_client(base_url, api_key))
+    else:
+        model = OpenAIResponsesModel(model=model_name, openai_client=get_client(None, openai_api_key))
+    return rate_limited(model, provider, model_name)
 
 
 async def get_researcher(mcp_servers, model_name) -> Agent:
@@ -71,28 +108,50 @@ class Trader:
         self.agent = None
         self.model_name = model_name
         self.do_trade = True
+        self.cycle = None
+        self.startup_seconds = None
 
     async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
-        tool = await get_researcher_tool(researcher_mcp_servers, self.model_name)
+        tools = [await get_researcher_tool(researcher_mcp_servers, self.model_name)]
+        if use_local_accounts:
+            tools += await get_accounts_tools_local()
         self.agent = Agent(
             name=self.name,
             instructions=trader_instructions(self.name),
             model=get_model(self.model_name),
-            tools=[tool],
+            tools=tools,
             mcp_servers=trader_mcp_servers,
         )
         return self.agent
 
-    async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
+    async def get_account_report(self, pool: MCPServerPool | None = None) -> str:
+        if use_local_accounts:
+            account = await read_accounts_resource_local(self.name)
+        elif pool:
+            account = await pool.read_accounts_resource(f"accounts://accounts_server/{self.name}")
+        else:
+            account = await read_accounts_resource(self.name)
         account_json = json.loads(account)
         account_json.pop("portfolio_value_time_series", None)
         return json.dumps(account_json)
 
-    async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
+    async def get_strategy(self, pool: MCPServerPool | None = None) -> str:
+        if use_local_accounts:
+            return await read_strategy_resource_local(self.name)
+        elif pool:
+            return await pool.read_accounts_resource(f"accounts://strategy/{self.name}")
+        return await read_strategy_resource(self.name)
+
+    async def run_agent(self, trader_mcp_servers, researcher_mcp_servers, pool: MCPServerPool | None = None):
+        # Startup for a cycle is creating the agent and listing its tools, which with the pool's servers
+        # already running is all of it; each server caches its tool list, so the run doesn't list them again
+        started = time.monotonic()
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
-        account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        await self.agent.get_all_tools(RunContextWrapper(context=None))
+        self.startup_seconds = time.monotonic() - started
+        print(f"{self.name} cycle {self.cycle} started up in {self.startup_seconds:.2f}s")
+        account = await self.get_account_report(pool)
+        strategy = await self.get_strategy(pool)
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -117,15 +176,29 @@ class Trader:
                 ]
                 await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
 
-    async def run_with_trace(self):
+    async def run_with_pool(self, pool: MCPServerPool):
+        await self.run_agent(pool.trader_servers(), pool.researcher_servers(self.name), pool)
+
+    async def run_with_trace(self, pool: MCPServerPool | None = None):
         trace_name = f"{self.name}-trading" if self.do_trade else f"{self.name}-rebalancing"
         trace_id = make_trace_id(f"{self.name.lower()}")
-        with trace(trace_name, trace_id=trace_id):
-            await self.run_with_mcp_servers()
-
-    async def run(self):
+        register_trace(trace_id, self.name, self.cycle, "trade" if self.do_trade else "rebalance")
+        try:
+            with trace(trace_name, trace_id=trace_id):
+                if pool:
+                    await self.run_with_pool(pool)
+                else:
+                    await self.run_with_mcp_servers()
+        finally:
+            unregister_trace(trace_id)
+
+    async def run(self, pool: MCPServerPool | None = None):
+        if self.cycle is None:
+            # Carry on numbering from the last run logged before a restart
+            self.cycle = await asyncio.to_thread(read_latest_cycle, self.name)
+        self.cycle += 1
         try:
-            await self.run_with_trace()
+            await self.run_with_trace(pool)
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
         self.do_trade = not self.do_trade
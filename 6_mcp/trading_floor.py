@@ -1,9 +1,15 @@
 from traders import Trader
 from typing import List
 import asyncio
-from tracers import LogTracer
+import json
+from tracers import LogTracer, MetricsTracer, latency_histograms
 from agents import add_trace_processor
-from market import is_market_open
+from market_cache import cache_stats
+from llm_cache import LLM_CACHE_MODE, llm_cache_stats
+from rate_limiter import rate_limit_stats
+from database import archive_logs, prune_metrics
+from mcp_pool import MCPServerPool
+from scheduler import Scheduler
 from dotenv import load_dotenv
 import os
 
@@ -15,20 +21,49 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
 
-names = ["Warren", "George", "Ray", "Cathie"]
-lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
+# The traders can be listed in a JSON file instead, as {"traders": [{"name": ..., "lastname": ..., "model": ...}]}
+# with optional "short_model_name", "strategy" and "cadence_minutes" for each; see traders.example.json
+
+TRADERS_CONFIG = os.getenv("TRADERS_CONFIG", "traders.json")
+
+default_names = ["Warren", "George", "Ray", "Cathie"]
+default_lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
 
 if USE_MANY_MODELS:
-    model_names = [
+    default_model_names = [
         "gpt-4.1-mini",
         "deepseek-chat",
         "gemini-2.5-flash-preview-04-17",
         "grok-3-mini-beta",
     ]
-    short_model_names = ["GPT 4.1 Mini", "DeepSeek V3", "Gemini 2.5 Flash", "Grok 3 Mini"]
+    default_short_model_names = ["GPT 4.1 Mini", "DeepSeek V3", "Gemini 2.5 Flash", "Grok 3 Mini"]
 else:
-    model_names = ["gpt-4o-mini"] * 4
-    short_model_names = ["GPT 4o mini"] * 4
+    default_model_names = ["gpt-4o-mini"] * 4
+    default_short_model_names = ["GPT 4o mini"] * 4
+
+
+def load_trader_config() -> list[dict]:
+    if os.path.exists(TRADERS_CONFIG):
+        with open(TRADERS_CONFIG) as f:
+            config = json.load(f)["traders"]
+    else:
+        config = [
+            {"name": name, "lastname": lastname, "model": model, "short_model_name": short_model_name}
+            for name, lastname, model, short_model_name in zip(
+                default_names, default_lastnames, default_model_names, default_short_model_names
+            )
+        ]
+    for trader in config:
+        trader.setdefault("short_model_name", trader["model"])
+        trader.setdefault("cadence_minutes", RUN_EVERY_N_MINUTES)
+    return config
+
+
+trader_config = load_trader_config()
+names = [trader["name"] for trader in trader_config]
+lastnames = [trader["lastname"] for trader in trader_config]
+model_names = [trader["model"] for trader in trader_config]
+short_model_names = [trader["short_model_name"] for trader in trader_config]
 
 
 def create_traders() -> List[Trader]:
@@ -38,17 +73,65 @@ def create_traders() -> List[Trader]:
     return traders
 
 
+def print_latency_histograms(hours: float) -> None:
+    """One line for each kind of span, model, tool and MCP server seen in the last few hours"""
+    histograms = latency_histograms(hours)
+    if not histograms:
+        return
+    print(f"Latency over the last {hours:g}h:")
+    for (kind, label, server), histogram in sorted(histograms.items(), key=lambda item: [part or "" for part in item[0]]):
+        name = f"{kind} {label or ''}" + (f" on {server}" if server else "")
+        buckets = ", ".join(f"{bucket}: {count}" for bucket, count in histogram["buckets"].items() if count)
+        print(
+            f"  {name}: {histogram['count']} spans, p50 {histogram['p50_ms']:.0f}ms, p95 {histogram['p95_ms']:.0f}ms, "
+            f"max {histogram['max_ms']:.0f}ms ({buckets})"
+        )
+
+
+async def housekeeping(pool: MCPServerPool) -> None:
+    """Restart any MCP servers that have died, report cache stats and latencies, and archive old logs and metrics"""
+    await pool.check_health()
+    print(f"Health check took {pool.last_health_check_seconds:.2f}s ({pool.restarts} MCP server restarts so far)")
+    try:
+        market_stats = await pool.read_market_cache_stats()
+        if market_stats is not None:
+            print(f"Market data cache (market server): {market_stats}")
+    except Exception as e:
+        print(f"Could not read market server cache stats: {e}")
+    print(f"Market data cache (trading floor process): {cache_stats()}")
+    print(f"Model rate limits: {rate_limit_stats()}")
+    if LLM_CACHE_MODE != "off":
+        print(f"LLM response cache: {llm_cache_stats()}")
+    await asyncio.to_thread(print_latency_histograms, RUN_EVERY_N_MINUTES / 60)
+    archived = await asyncio.to_thread(archive_logs)
+    if archived:
+        print(f"Archived {archived} log entries")
+    pruned = await asyncio.to_thread(prune_metrics)
+    if pruned:
+        print(f"Deleted {pruned} old span timings")
+
+
 async def run_every_n_minutes():
     add_trace_processor(LogTracer())
+    add_trace_processor(MetricsTracer())
     traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    pool = MCPServerPool([trader.name for trader in traders])
+    try:
+        await pool.start()
+        print(f"Started MCP server pool in {pool.last_startup_seconds:.1f}s")
+        scheduler = Scheduler(
+            traders,
+            pool,
+            cadences={trader["name"]: trader["cadence_minutes"] for trader in trader_config},
+            housekeeping=lambda: housekeeping(pool),
+            housekeeping_minutes=RUN_EVERY_N_MINUTES,
+            run_when_closed=RUN_EVEN_WHEN_MARKET_IS_CLOSED,
+        )
+        await scheduler.run()
+    finally:
+        await pool.close()
 
 
 if __name__ == "__main__":
-    print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
+    print(f"Starting scheduler for {len(names)} traders, by default every {RUN_EVERY_N_MINUTES} minutes")
     asyncio.run(run_every_n_minutes())